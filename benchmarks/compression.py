@@ -0,0 +1,90 @@
+"""
+Compares the write throughput and the compression ratio of the codecs and levels
+on a tracks table of synthetic tracks. Codecs which are not installed are skipped.
+
+    poetry run python -m benchmarks.compression
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import tests.data as data
+from paddle.downloader.config import Config, FileType, SpotifyConfig
+from paddle.downloader.models import Playlist, PlaylistTrack
+from paddle.downloader.records import TracksRecords, table_path
+from paddle.downloader.rows import TrackRow
+
+NUM_TRACKS = 200_000
+LEVELS = {
+    FileType.csv: [None],
+    FileType.csvgz: [1, 6, 9],
+    FileType.csvzst: [1, 3, 9, 19],
+    FileType.csvlz4: [0, 9],
+}
+
+
+def create_rows() -> list[TrackRow]:
+    # the rows differ in their number only, so they are made unique from a few validated tracks
+    tracks = [
+        TrackRow.create(PlaylistTrack.model_validate(data.create_numbered_track(num)))
+        for num in range(100)
+    ]
+    rows = []
+    for num in range(NUM_TRACKS):
+        row = tracks[num % len(tracks)]
+        rows.append(
+            TrackRow(
+                type=row.type,
+                id=f"{num:022d}",
+                name=f"{row.name} {num}",
+                popularity=num % 100,
+                uri=f"spotify:track:{num:022d}",
+                album_type=row.album_type,
+            )
+        )
+    return rows
+
+
+def measure(
+    output_dir: Path, file_type: FileType, level: int | None, rows: list[TrackRow]
+) -> tuple[float, int]:
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=output_dir,
+        file_type=file_type,
+        compression_level=level,
+    )
+    start = time.perf_counter()
+    builder = TracksRecords(config)
+    playlist = Playlist.model_validate(data.dummy_playlist1)
+    for row in rows:
+        builder.add_track(playlist, row)
+    builder.close()
+    seconds = time.perf_counter() - start
+    path = table_path(config, "tracks_records")
+    size = path.stat().st_size
+    path.unlink()
+    return seconds, size
+
+
+def main():
+    rows = create_rows()
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_seconds, csv_size = measure(Path(tmp), FileType.csv, None, rows)
+        print(f"{NUM_TRACKS} tracks, {csv_size / 1024**2:.1f} MiB of CSV")
+        for file_type, levels in LEVELS.items():
+            for level in levels:
+                try:
+                    seconds, size = measure(Path(tmp), file_type, level, rows)
+                except ImportError:
+                    print(f"{file_type!s:>6}: not installed")
+                    break
+                print(
+                    f"{file_type!s:>6} level {level!s:>4}: "
+                    f"{csv_size / 1024**2 / seconds:6.1f} MiB/s, "
+                    f"ratio {csv_size / size:5.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
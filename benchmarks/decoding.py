@@ -0,0 +1,47 @@
+"""
+Compares the JSON decoders on the responses decoded into dicts and on a page of 100 tracks.
+Decoders which are not installed are skipped.
+
+    poetry run python -m benchmarks.decoding
+"""
+import json
+import timeit
+
+import tests.data as data
+from paddle.downloader.config import JsonDecoder
+from paddle.downloader.session import get_json_loads
+
+PAGE_SIZE = 100
+REPEAT = 200
+
+
+def create_responses() -> dict[str, bytes]:
+    tracks = [data.create_numbered_track(num) for num in range(PAGE_SIZE)]
+    page = data.create_page(
+        items=tracks, href="tracks", offset=0, limit=PAGE_SIZE, total=PAGE_SIZE
+    )
+    artists = [data.create_full_artist(f"ARTISTID{num}") for num in range(50)]
+    albums = [data.create_full_album(f"ALBUMID{num}") for num in range(20)]
+    return {
+        "tracks page": json.dumps(page).encode(),
+        "50 artists": json.dumps({"artists": artists}).encode(),
+        "20 albums": json.dumps({"albums": albums}).encode(),
+    }
+
+
+def main():
+    responses = create_responses()
+    for decoder in JsonDecoder:
+        loads = get_json_loads(decoder)
+        if decoder != JsonDecoder.stdlib and loads is json.loads:
+            continue
+        for name, response in responses.items():
+            seconds = timeit.timeit(lambda: loads(response), number=REPEAT)
+            print(
+                f"{decoder!s:>7} {name:>11} ({len(response) / 1024:.0f} KiB): "
+                f"{seconds / REPEAT * 1000:.3f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares validating a page of 100 playlist tracks with the full and the lean models.
+
+    poetry run python -m benchmarks.models
+"""
+import json
+import timeit
+import tracemalloc
+
+import tests.data as data
+from paddle.downloader.lean import TrackModels, FULL_TRACK_MODELS
+from paddle.downloader.records import (
+    TracksRecords,
+    PlaylistTrackIdRecords,
+    TrackArtistIdRecords,
+    ArtistsRecords,
+    AlbumsRecords,
+)
+
+PAGE_SIZE = 100
+REPEAT = 200
+
+
+def create_tracks_page() -> bytes:
+    items = [data.create_numbered_track(num) for num in range(PAGE_SIZE)]
+    page = data.create_page(
+        items=items, href="tracks", offset=0, limit=PAGE_SIZE, total=PAGE_SIZE
+    )
+    return json.dumps(page).encode()
+
+
+def measure(name: str, models: TrackModels, page: bytes):
+    seconds = timeit.timeit(
+        lambda: models.tracks_page.validate_json(page), number=REPEAT
+    )
+    tracemalloc.start()
+    validated = models.tracks_page.validate_json(page)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(validated.items) == PAGE_SIZE
+    print(
+        f"{name:>5}: {seconds / REPEAT * 1000:.2f} ms, "
+        f"{allocated / 1024:.0f} KiB retained per page"
+    )
+
+
+def main():
+    # the paths read by all builders reading tracks
+    track_paths = tuple(
+        path
+        for builder in (
+            TracksRecords,
+            PlaylistTrackIdRecords,
+            TrackArtistIdRecords,
+            ArtistsRecords,
+            AlbumsRecords,
+        )
+        for path in builder.track_paths
+    )
+    page = create_tracks_page()
+    print(f"Page of {PAGE_SIZE} tracks: {len(page) / 1024:.0f} KiB")
+    measure("full", FULL_TRACK_MODELS, page)
+    measure("lean", TrackModels.lean(track_paths), page)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Measures the write path of the record builders, from the track rows to the CSV tables,
+on synthetic playlists whose tracks share a pool of artists.
+
+    poetry run python -m benchmarks.records
+"""
+import random
+import string
+import tempfile
+import time
+from pathlib import Path
+
+import tests.data as data
+from paddle.downloader.config import Config, FileType, SpotifyConfig
+from paddle.downloader.main import build_records, create_record_builder
+from paddle.downloader.models import Playlist
+from paddle.downloader.rows import TrackRow
+
+NUM_PLAYLISTS = 1000
+TRACKS_PER_PLAYLIST = 100
+NUM_TRACKS = 50_000
+NUM_ARTISTS = 5000
+REPEAT = 3
+# the base62 digits of the Spotify IDs
+ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+
+
+def random_id(rng: random.Random) -> str:
+    # Spotify IDs encode 128 bits
+    value = rng.getrandbits(128)
+    digits = []
+    for _ in range(22):
+        value, digit = divmod(value, 62)
+        digits.append(ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+def create_playlists() -> list[tuple[Playlist, list[TrackRow]]]:
+    rng = random.Random(42)
+    artists = [(random_id(rng), f"Artist {num}") for num in range(NUM_ARTISTS)]
+    tracks = []
+    for num in range(NUM_TRACKS):
+        track_artists = rng.sample(artists, 2)
+        tracks.append(
+            TrackRow(
+                type="track",
+                added_at="2023-05-01T12:00:00+00:00",
+                id=random_id(rng),
+                name=f"Track {num}",
+                popularity=num % 100,
+                uri=f"spotify:track:{num}",
+                album_id=random_id(rng),
+                album_type="album",
+                artist_ids=tuple(artist_id for artist_id, _ in track_artists),
+                artist_names=tuple(name for _, name in track_artists),
+            )
+        )
+    playlist = Playlist.model_validate(data.dummy_playlist1)
+    return [
+        (
+            playlist.model_copy(update={"id": random_id(rng)}),
+            rng.sample(tracks, TRACKS_PER_PLAYLIST),
+        )
+        for _ in range(NUM_PLAYLISTS)
+    ]
+
+
+def measure(
+    output_dir: Path, playlists: list[tuple[Playlist, list[TrackRow]]]
+) -> float:
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=output_dir,
+        file_type=FileType.csv,
+    )
+    builder = create_record_builder(config)
+    start = time.perf_counter()
+    for playlist, rows in playlists:
+        build_records(builder, playlist, rows)
+    builder.close()
+    return time.perf_counter() - start
+
+
+def main():
+    playlists = create_playlists()
+    num_rows = NUM_PLAYLISTS * TRACKS_PER_PLAYLIST
+    with tempfile.TemporaryDirectory() as tmp:
+        seconds = min(measure(Path(tmp), playlists) for _ in range(REPEAT))
+    print(
+        f"{num_rows} track rows: {seconds:.2f} s, "
+        f"{seconds / num_rows * 1e6:.2f} µs per track row"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,527 @@
+"""
+Asyncio counterparts of the session and clients, based on httpx.
+Allows many in-flight requests on a single thread.
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, AsyncContextManager, Callable, Dict
+from urllib.parse import urlparse
+
+import httpx
+from pydantic import TypeAdapter
+from pyrate_limiter import Limiter, RequestRate
+
+from paddle.downloader.cache import ResponseCache, CacheEntry
+from paddle.downloader.config import Config, SpotifyConfig, Pagination
+from paddle.downloader.main import build_records, get_stored_playlist
+from paddle.downloader.enrichment import (
+    ARTISTS_BATCH_SIZE,
+    ALBUMS_BATCH_SIZE,
+    Enrichment,
+)
+from paddle.downloader.models import (
+    Album,
+    Artist,
+    Page,
+    Playlist,
+    PlaylistTrack,
+    SimplifiedPlaylist,
+)
+from paddle.downloader.client import playlists_adapter
+from paddle.downloader.lean import TrackModels, FULL_TRACK_MODELS
+from paddle.downloader.pagination import offset_urls, set_query
+from paddle.downloader.projection import Projection
+from paddle.downloader.rate import AdaptiveRate, HostCooldown
+from paddle.downloader.records import RecordBuilder
+from paddle.downloader.session import (
+    ACCEPT_ENCODING,
+    RateLimitError,
+    TransferStats,
+    create_adaptive_rate,
+    get_json_loads,
+    get_response_dict,
+    get_response_model,
+)
+from paddle.downloader.rows import TrackRow, PlaylistCounts
+from paddle.downloader.state import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+@dataclass
+class AsyncSpotifySessionCreator:
+    """
+    Creates an AsyncSessionWithBase with rate-limiting and retries and the spotify base URL.
+    """
+
+    config: SpotifyConfig
+    transport: httpx.AsyncBaseTransport | None = None
+
+    async def create_session(self) -> "AsyncSessionWithBase":
+        rate = RequestRate(
+            limit=self.config.rate_limit_requests_per_bucket,
+            interval=self.config.rate_limit_bucket_size_seconds,
+        )
+        session = AsyncSessionWithBase(
+            config=self.config, limiter=Limiter(rate), transport=self.transport
+        )
+        session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        if self.config.adaptive_rate_limit:
+            session.rate = create_adaptive_rate(self.config)
+        if self.config.cache_dir is not None:
+            session.cache = ResponseCache(
+                self.config.cache_dir, max_bytes=self.config.cache_max_bytes
+            )
+        session.headers.update(await self.__get_bearer_token_headers(session))
+        return session
+
+    async def __get_app_access_token(self, session: httpx.AsyncClient) -> str:
+        """
+        Returns: an access token to be used in downstream API calls as Authorization headers
+        """
+        response = await session.post(
+            url=self.config.auth_url,
+            data={
+                "grant_type": "client_credentials",
+                "client_id": self.config.client_id,
+                "client_secret": self.config.client_secret,
+            },
+        )
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    async def __get_bearer_token_headers(
+        self, session: httpx.AsyncClient
+    ) -> Dict[str, str]:
+        access_token = await self.__get_app_access_token(session)
+        return {"Authorization": f"Bearer {access_token}"}
+
+
+class AsyncSessionWithBase(httpx.AsyncClient):
+    """
+    Async counterpart of SessionWithBase.
+    Rate-limits requests per host, retries server errors with an exponential backoff
+    and handles rate-limit errors softly by parking all requests to the host for Retry-After seconds.
+    If an adaptive rate is set, requests are paced by it instead of the limiter.
+    If a cache is set, GET responses with an ETag are cached and revalidated with If-None-Match.
+    """
+
+    config: SpotifyConfig
+    limiter: Limiter
+    cache: ResponseCache | None = None
+    rate: AdaptiveRate | None = None
+    cooldown: HostCooldown
+    transfer: TransferStats
+    json_loads: Callable[[bytes], Any]
+
+    def __init__(self, config: SpotifyConfig, limiter: Limiter, **kwargs):
+        super(AsyncSessionWithBase, self).__init__(**kwargs)
+        self.config = config
+        self.json_loads = get_json_loads(config.json_decoder)
+        self.limiter = limiter
+        self.cooldown = HostCooldown()
+        self.transfer = TransferStats()
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        max_wait = self.config.rate_limit_max_wait_seconds
+        give_up_at = time.monotonic() + max_wait
+        url = url if urlparse(url).scheme else self.config.base_url + url
+        host = urlparse(url).netloc
+        headers = kwargs.get("headers")
+        cached = self.cache.get(url) if self.cache and method == "GET" else None
+        if cached is not None:
+            kwargs["headers"] = {**(headers or {}), "If-None-Match": cached.etag}
+        while True:
+            parked = self.cooldown.remaining(host)
+            if parked > 0:
+                await asyncio.sleep(parked)
+            sent_at = await self.__wait_for_rate()
+            response = await self.__request_with_retries(method, url, **kwargs)
+            self.transfer.add(response.num_bytes_downloaded)
+            if response.status_code != 429:
+                if self.rate is not None:
+                    self.rate.on_success()
+                cached_response = self.__cache_response(url, response, cached)
+                if cached_response is not None:
+                    return cached_response
+                # the cached body was evicted since, so the request is sent again without it
+                cached = None
+                kwargs["headers"] = headers
+                continue
+            retry_after = int(
+                response.headers.get(
+                    "Retry-After", self.config.rate_limit_bucket_size_seconds
+                )
+            )
+            logger.warning(f"Rate-limit encountered with Retry-After: {retry_after}")
+            self.cooldown.start(host, retry_after)
+            if self.rate is not None:
+                self.rate.on_rate_limited(sent_at, retry_after)
+            if time.monotonic() + retry_after > give_up_at:
+                raise RateLimitError(f"Still rate-limited by {host} after {max_wait}s")
+
+    def __cache_response(
+        self, url: str, response: httpx.Response, cached: CacheEntry | None
+    ) -> httpx.Response | None:
+        """
+        Returns: the response, with the cached body if not modified,
+            None if the cached body is missing
+        """
+        if cached is not None and response.status_code == 304:
+            content = self.cache.load(cached)
+            if content is None:
+                return None
+            return httpx.Response(
+                200,
+                content=content,
+                headers={"ETag": cached.etag},
+                request=response.request,
+            )
+        if self.cache and response.request.method == "GET" and response.is_success:
+            etag = response.headers.get("ETag")
+            if etag is not None:
+                self.cache.put(url, etag, response.content)
+        return response
+
+    async def aclose(self):
+        logger.info(f"HTTP transfer: {self.transfer}")
+        if self.cache is not None:
+            logger.info(f"HTTP cache: {self.cache.stats}")
+        if self.rate is not None:
+            logger.info(f"Adaptive rate: {self.rate}")
+        await super(AsyncSessionWithBase, self).aclose()
+
+    async def __request_with_retries(
+        self, method: str, url: str, **kwargs
+    ) -> httpx.Response:
+        """
+        Mirrors the urllib3 Retry configuration of the synchronous session.
+        """
+        max_retries = self.config.retry_max_retries
+        for retry in range(max_retries + 1):
+            if retry > 1:
+                await asyncio.sleep(self.config.retry_backoff * 2 ** (retry - 1))
+            async with self.__ratelimit(url):
+                try:
+                    response = await super(AsyncSessionWithBase, self).request(
+                        method, url, **kwargs
+                    )
+                except httpx.TransportError as e:
+                    if retry == max_retries:
+                        raise e
+                    logger.warning(f"Retrying {url} after error: {e}")
+                    continue
+            if response.status_code not in RETRY_STATUSES or retry == max_retries:
+                return response
+            logger.warning(f"Retrying {url} after status: {response.status_code}")
+
+    async def __wait_for_rate(self) -> float:
+        """
+        Returns: the time the request is sent at, after waiting for the adaptive rate
+        """
+        if self.rate is None:
+            return time.monotonic()
+        sent_at = self.rate.reserve()
+        delay = sent_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return sent_at
+
+    def __ratelimit(self, url: str) -> AsyncContextManager:
+        if self.rate is not None:
+            # already paced by the adaptive rate
+            return contextlib.nullcontext()
+        return self.limiter.ratelimit(urlparse(url).netloc, delay=True)
+
+
+async def get_page(
+    session: AsyncSessionWithBase,
+    url: str,
+    adapter: TypeAdapter,
+    key: str | None = None,
+) -> Page:
+    data = get_response_model(await session.get(url), adapter)
+    return getattr(data, key) if key is not None else data
+
+
+async def get_pages(
+    session: AsyncSessionWithBase,
+    page: Page,
+    adapter: TypeAdapter,
+    key: str | None = None,
+    pagination: Pagination = Pagination.next,
+    window: int = 1,
+    params: dict[str, str] | None = None,
+) -> AsyncIterator[Page]:
+    """
+    Async counterpart of pagination.get_pages.
+    With the offset pagination, at most `window` pages are requested concurrently.
+    """
+
+    async def fetch(url: str) -> Page:
+        return await get_page(
+            session, set_query(url, params) if params else url, adapter, key
+        )
+
+    yield page
+    match pagination:
+        case Pagination.next:
+            while page.next is not None:
+                page = await fetch(page.next)
+                yield page
+        case Pagination.offset:
+            pending: deque[asyncio.Task] = deque()
+            for url in offset_urls(page):
+                pending.append(asyncio.create_task(fetch(url)))
+                if len(pending) >= window:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+
+
+@dataclass
+class AsyncPlaylistClient:
+    """
+    Async client over a Spotify Playlist.
+    Allows to lazily fetch all tracks of a given playlist.
+    """
+
+    session: AsyncSessionWithBase
+    playlist: Playlist
+    # first page of tracks, as embedded in the playlist details
+    tracks_page: Page[PlaylistTrack]
+    # validates the following tracks pages
+    tracks_page_adapter: TypeAdapter
+    pagination: Pagination = Pagination.next
+    page_window: int = 1
+    # `fields` projection of the following tracks pages
+    tracks_fields: str | None = None
+
+    async def get_tracks(self) -> AsyncIterator[PlaylistTrack]:
+        pages = get_pages(
+            self.session,
+            self.tracks_page,
+            self.tracks_page_adapter,
+            pagination=self.pagination,
+            window=self.page_window,
+            params={"fields": self.tracks_fields} if self.tracks_fields else None,
+        )
+        async for page in pages:
+            for item in page.items:
+                yield item
+
+
+@dataclass
+class AsyncSpotifyClient:
+    """
+    A mini async Spotify client to fetch playlists.
+    """
+
+    session: AsyncSessionWithBase
+    pagination: Pagination = Pagination.next
+    # maximum number of pages in flight with the offset pagination
+    page_window: int = 1
+    # fields requested of the playlist endpoints, all if not set
+    projection: Projection | None = None
+    track_models: TrackModels = FULL_TRACK_MODELS
+
+    async def get_playlists(
+        self, category_id: str
+    ) -> AsyncIterator[SimplifiedPlaylist]:
+        first_page = await get_page(
+            self.session,
+            f"browse/categories/{category_id}/playlists?limit=50",
+            playlists_adapter,
+            key="playlists",
+        )
+        pages = get_pages(
+            self.session,
+            first_page,
+            playlists_adapter,
+            key="playlists",
+            pagination=self.pagination,
+            window=self.page_window,
+        )
+        async for page in pages:
+            for item in page.items:
+                yield item
+
+    async def get_albums(self, album_ids: list[str]) -> list[Album]:
+        """
+        Fetches the full album objects of up to 20 album IDs with a single request.
+        """
+        assert len(album_ids) <= ALBUMS_BATCH_SIZE
+        res = await self.session.get(f"albums?ids={','.join(album_ids)}")
+        data = get_response_dict(res, self.session.json_loads)
+        # unknown IDs are returned as null
+        return [Album.model_validate(item) for item in data["albums"] if item]
+
+    async def get_artists(self, artist_ids: list[str]) -> list[Artist]:
+        """
+        Fetches the full artist objects of up to 50 artist IDs with a single request.
+        """
+        assert len(artist_ids) <= ARTISTS_BATCH_SIZE
+        res = await self.session.get(f"artists?ids={','.join(artist_ids)}")
+        data = get_response_dict(res, self.session.json_loads)
+        # unknown IDs are returned as null
+        return [Artist.model_validate(item) for item in data["artists"] if item]
+
+    async def get_playlist(self, playlist_id: str) -> AsyncPlaylistClient:
+        url = f"playlists/{playlist_id}"
+        if self.projection is not None:
+            url = set_query(url, {"fields": self.projection.playlist})
+        details = get_response_model(
+            await self.session.get(url), self.track_models.playlist_details
+        )
+        return AsyncPlaylistClient(
+            self.session,
+            playlist=details.to_playlist(),
+            tracks_page=details.tracks,
+            tracks_page_adapter=self.track_models.tracks_page,
+            pagination=self.pagination,
+            page_window=self.page_window,
+            tracks_fields=self.projection.tracks if self.projection else None,
+        )
+
+
+async def download(
+    config: Config,
+    builder: RecordBuilder,
+    transport: httpx.AsyncBaseTransport | None = None,
+    store: SnapshotStore | None = None,
+):
+    session_creator = AsyncSpotifySessionCreator(
+        config=config.spotify, transport=transport
+    )
+    session = await session_creator.create_session()
+    try:
+        client = AsyncSpotifyClient(
+            session=session,
+            pagination=config.pagination,
+            page_window=config.page_workers,
+        )
+        client.track_models = TrackModels.from_config(config, builder)
+        if config.project_fields:
+            client.projection = Projection.create(
+                builder.playlist_paths,
+                builder.track_paths,
+                track_model=client.track_models.track,
+            )
+        enrichment = Enrichment.from_config(config)
+        for category_id in config.category_ids:
+            logger.info(f"Starting to process category: '{category_id}'")
+            if enrichment is not None and enrichment.partitioned:
+                # the enriched rows of the previous category are written into its partition
+                await enrich(client, builder, enrichment)
+                enrichment.start_category()
+            builder.start_category(category_id)
+            await fetch_playlists(
+                client,
+                builder,
+                category_id,
+                workers=config.workers,
+                store=store,
+                enrichment=enrichment,
+            )
+        if enrichment is not None:
+            await enrich(client, builder, enrichment)
+    finally:
+        await session.aclose()
+
+
+async def fetch_playlists(
+    client: AsyncSpotifyClient,
+    builder: RecordBuilder,
+    category_id: str,
+    workers: int = 1,
+    store: SnapshotStore | None = None,
+    enrichment: Enrichment | None = None,
+):
+    """
+    Downloads up to `workers` playlists concurrently as tasks.
+    Results are consumed in listing order, so the records are identical to a sequential run.
+    """
+    playlist_ids = set()
+    pending: deque[asyncio.Task] = deque()
+
+    async def consume(max_pending: int):
+        while len(pending) > max_pending:
+            if not builder.reads_tracks:
+                playlist, counts = await pending.popleft()
+                builder.end_playlist(playlist, counts)
+                continue
+            playlist, rows = await pending.popleft()
+            build_records(builder, playlist, rows)
+            if store is not None:
+                store.put(playlist, rows)
+            if enrichment is not None:
+                await enrich(client, builder, enrichment, rows)
+
+    async for item in client.get_playlists(category_id):
+        if item.id in playlist_ids:
+            logger.info(f"Ignoring duplicate playlist ID: {item.id}")
+            continue
+        playlist_ids.add(item.id)
+        logger.info(f"Fetched playlist ID: {item.id}")
+        if builder.reads_tracks:
+            task = download_playlist(client, item, store)
+        else:
+            # no builder reads the tracks, so only the playlist details are fetched
+            task = fetch_details(client, item)
+        pending.append(asyncio.create_task(task))
+        await consume(max_pending=workers - 1)
+        if enrichment is not None:
+            # the partial batches waiting too long are due while listing as well
+            await enrich(client, builder, enrichment, [])
+    await consume(max_pending=0)
+    logger.info(f"Downloaded {len(playlist_ids)} playlists")
+
+
+async def enrich(
+    client: AsyncSpotifyClient,
+    builder: RecordBuilder,
+    enrichment: Enrichment,
+    rows: list[TrackRow] | None = None,
+):
+    """
+    Async counterpart of main.enrich.
+    """
+    for batch in enrichment.artist_batches(rows):
+        builder.add_artists(await client.get_artists(batch))
+    for batch in enrichment.album_batches(rows):
+        builder.add_albums(await client.get_albums(batch))
+
+
+async def fetch_details(
+    client: AsyncSpotifyClient, item: SimplifiedPlaylist
+) -> tuple[Playlist, PlaylistCounts]:
+    """
+    Async counterpart of main.fetch_details.
+    """
+    playlist_client = await client.get_playlist(item.id)
+    return playlist_client.playlist, PlaylistCounts.from_total(
+        playlist_client.tracks_page.total
+    )
+
+
+async def download_playlist(
+    client: AsyncSpotifyClient,
+    item: SimplifiedPlaylist,
+    store: SnapshotStore | None = None,
+) -> tuple[Playlist, list[TrackRow]]:
+    """
+    Fetches the playlist details and the rows of all of its track pages,
+    unless the playlist is unchanged in the store.
+    """
+    stored = get_stored_playlist(item, store)
+    if stored is not None:
+        return stored
+    playlist_client = await client.get_playlist(item.id)
+    rows = [TrackRow.create(track) async for track in playlist_client.get_tracks()]
+    return playlist_client.playlist, rows
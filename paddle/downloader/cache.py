@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    # requests answered from disk after a 304 Not Modified
+    hits: int = 0
+    # requests without any cached response
+    misses: int = 0
+    # conditional requests sent with the ETag of a cached response
+    revalidations: int = 0
+
+    def __str__(self):
+        return f"{self.hits} hits, {self.misses} misses, {self.revalidations} revalidations"
+
+
+@dataclass
+class CacheEntry:
+    etag: str
+    path: Path
+
+
+class ResponseCache:
+    """
+    On-disk cache of response bodies keyed by URL, revalidated with their ETag.
+    The least recently used entries are evicted once the bodies exceed `max_bytes`.
+    """
+
+    directory: Path
+    max_bytes: int
+    stats: CacheStats
+    # body size by cache key, in least recently used order
+    sizes: OrderedDict[str, int]
+    lock: threading.Lock
+
+    def __init__(self, directory: Path, max_bytes: int):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        bodies = sorted(directory.glob("*.body"), key=lambda p: p.stat().st_mtime)
+        self.sizes = OrderedDict((p.stem, p.stat().st_size) for p in bodies)
+
+    def get(self, url: str) -> CacheEntry | None:
+        """
+        Returns: the cached entry to revalidate the request with, if any
+        """
+        key = self.__key(url)
+        with self.lock:
+            try:
+                etag = (self.directory / f"{key}.etag").read_text()
+            except FileNotFoundError:
+                self.stats.misses += 1
+                return None
+            self.stats.revalidations += 1
+            if key in self.sizes:
+                self.sizes.move_to_end(key)
+        return CacheEntry(etag=etag, path=self.directory / f"{key}.body")
+
+    def load(self, entry: CacheEntry) -> bytes | None:
+        """
+        Returns: the cached body of a revalidated (304 Not Modified) entry,
+            None if it was evicted since, in which case the entry is dropped
+        """
+        try:
+            os.utime(entry.path)
+            body = entry.path.read_bytes()
+        except FileNotFoundError:
+            key = entry.path.stem
+            with self.lock:
+                self.stats.misses += 1
+                self.sizes.pop(key, None)
+            self.__remove(key)
+            return None
+        with self.lock:
+            self.stats.hits += 1
+        return body
+
+    def put(self, url: str, etag: str, body: bytes):
+        key = self.__key(url)
+        # the ETag is written last, so it is never revalidated without its body
+        self.__write(self.directory / f"{key}.body", body)
+        self.__write(self.directory / f"{key}.etag", etag.encode())
+        with self.lock:
+            self.sizes[key] = len(body)
+            self.sizes.move_to_end(key)
+            evicted = self.__evict()
+        for key in evicted:
+            self.__remove(key)
+
+    def __remove(self, key: str):
+        # the ETag is removed first, for the same reason
+        for suffix in ("etag", "body"):
+            (self.directory / f"{key}.{suffix}").unlink(missing_ok=True)
+
+    def __evict(self) -> list[str]:
+        total = sum(self.sizes.values())
+        evicted = []
+        while total > self.max_bytes and len(self.sizes) > 1:
+            key, size = self.sizes.popitem(last=False)
+            total -= size
+            evicted.append(key)
+        return evicted
+
+    @staticmethod
+    def __key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    @staticmethod
+    def __write(path: Path, content: bytes):
+        # write atomically, as the cache is shared between the download workers
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
@@ -1,46 +1,88 @@
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from typing import Iterator
 
-from pydantic import ValidationError
+from pydantic import TypeAdapter
 from requests import Session
 
-from paddle.downloader.models import Playlist
+from paddle.downloader.enrichment import ARTISTS_BATCH_SIZE, ALBUMS_BATCH_SIZE
+from paddle.downloader.lean import TrackModels, FULL_TRACK_MODELS
+from paddle.downloader.models import Album, Artist, CategoryPlaylists
 from paddle.downloader.models import SimplifiedPlaylist
+from paddle.downloader.pagination import get_pages, get_page, set_query
 from paddle.downloader.playlist import PlaylistClient
-from paddle.downloader.session import get_response_dict
+from paddle.downloader.projection import Projection
+from paddle.downloader.session import get_response_dict, get_response_model
+
+playlists_adapter = TypeAdapter(CategoryPlaylists)
 
 
 @dataclass
 class SpotifyClient:
     """
     A mini Spotify client to fetch playlists.
+    If a page executor is given, the pages of a listing are fetched in parallel by their offset.
     """
 
     session: Session
+    page_executor: Executor | None = None
+    # maximum number of pages in flight on the page executor
+    page_window: int = 1
+    # fields requested of the playlist endpoints, all if not set
+    projection: Projection | None = None
+    track_models: TrackModels = FULL_TRACK_MODELS
 
     def get_playlists(self, category_id: str) -> Iterator[SimplifiedPlaylist]:
-        next_url = f"browse/categories/{category_id}/playlists?limit=50"
-        while next_url is not None:
-            res = self.session.get(next_url)
-            data = get_response_dict(res)
-            playlists = data.get("playlists")
-            assert isinstance(playlists, dict)
-            next_url = playlists.get("next")
-            items = playlists["items"]
-            assert isinstance(items, list)
-            for item in items:
-                try:
-                    yield SimplifiedPlaylist.model_validate(item)
-                except ValidationError as e:
-                    raise e
+        first_page = get_page(
+            self.session,
+            f"browse/categories/{category_id}/playlists?limit=50",
+            playlists_adapter,
+            key="playlists",
+        )
+        pages = get_pages(
+            self.session,
+            first_page,
+            playlists_adapter,
+            key="playlists",
+            executor=self.page_executor,
+            window=self.page_window,
+        )
+        for page in pages:
+            yield from page.items
 
     def get_playlist(self, playlist_id: str) -> PlaylistClient:
-        res = self.session.get(f"playlists/{playlist_id}")
-        data = get_response_dict(res)
-        next_url = data["tracks"].get("next")
-        tracks = data["tracks"]["items"]
-        del data["tracks"]
-        playlist = Playlist.model_validate(data)
+        url = f"playlists/{playlist_id}"
+        if self.projection is not None:
+            url = set_query(url, {"fields": self.projection.playlist})
+        details = get_response_model(
+            self.session.get(url), self.track_models.playlist_details
+        )
         return PlaylistClient(
-            self.session, playlist=playlist, next_url=next_url, pending_tracks=tracks
+            self.session,
+            playlist=details.to_playlist(),
+            tracks_page=details.tracks,
+            tracks_page_adapter=self.track_models.tracks_page,
+            page_executor=self.page_executor,
+            page_window=self.page_window,
+            tracks_fields=self.projection.tracks if self.projection else None,
         )
+
+    def get_albums(self, album_ids: list[str]) -> list[Album]:
+        """
+        Fetches the full album objects of up to 20 album IDs with a single request.
+        """
+        assert len(album_ids) <= ALBUMS_BATCH_SIZE
+        res = self.session.get(f"albums?ids={','.join(album_ids)}")
+        data = get_response_dict(res, self.session.json_loads)
+        # unknown IDs are returned as null
+        return [Album.model_validate(item) for item in data["albums"] if item]
+
+    def get_artists(self, artist_ids: list[str]) -> list[Artist]:
+        """
+        Fetches the full artist objects of up to 50 artist IDs with a single request.
+        """
+        assert len(artist_ids) <= ARTISTS_BATCH_SIZE
+        res = self.session.get(f"artists?ids={','.join(artist_ids)}")
+        data = get_response_dict(res, self.session.json_loads)
+        # unknown IDs are returned as null
+        return [Artist.model_validate(item) for item in data["artists"] if item]
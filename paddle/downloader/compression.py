@@ -0,0 +1,150 @@
+"""
+Compression codecs of the CSV tables. zstd (zstandard) and lz4 are optional dependencies
+only required by their file types.
+"""
+import functools
+import gzip
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import BinaryIO, Callable, TextIO
+
+from paddle.downloader.config import FileType
+
+# size of the text blocks compressed in parallel, each block is a member (or frame) of the file
+BLOCK_SIZE = 1024 * 1024
+
+# the levels of the codecs by their file type: (minimum, default, maximum)
+LEVELS = {
+    FileType.csvgz: (1, 9, 9),
+    FileType.csvzst: (1, 3, 22),
+    FileType.csvlz4: (0, 0, 16),
+}
+
+
+def zstd_compress(block: bytes, level: int) -> bytes:
+    import zstandard
+
+    # the compressors are not thread-safe, so each block has its own
+    return zstandard.ZstdCompressor(level=level).compress(block)
+
+
+def lz4_compress(block: bytes, level: int) -> bytes:
+    import lz4.frame
+
+    return lz4.frame.compress(block, compression_level=level)
+
+
+def get_compress(file_type: FileType, level: int | None) -> Callable[[bytes], bytes]:
+    """
+    Returns: the function compressing a block into a gzip member, zstd frame or lz4 frame
+
+    Args:
+        level: the compression level, the default level of the codec if None
+    """
+    minimum, default, maximum = LEVELS[file_type]
+    if level is None:
+        level = default
+    if not minimum <= level <= maximum:
+        raise ValueError(
+            f"Compression level of {file_type} must be in [{minimum}, {maximum}]: {level}"
+        )
+    match file_type:
+        case FileType.csvgz:
+            return functools.partial(gzip.compress, compresslevel=level)
+        case FileType.csvzst:
+            return functools.partial(zstd_compress, level=level)
+        case FileType.csvlz4:
+            return functools.partial(lz4_compress, level=level)
+
+
+def open_compressed(path: Path, file_type: FileType) -> TextIO:
+    """
+    Returns: the decompressed text of all members (or frames) of the file
+    """
+    match file_type:
+        case FileType.csvgz:
+            return gzip.open(path, "rt")
+        case FileType.csvzst:
+            import zstandard
+
+            reader = zstandard.ZstdDecompressor().stream_reader(
+                open(path, "rb"), read_across_frames=True, closefd=True
+            )
+            return io.TextIOWrapper(reader, encoding="utf-8")
+        case FileType.csvlz4:
+            import lz4.frame
+
+            return lz4.frame.open(path, "rt")
+
+
+class ParallelBlockWriter(io.TextIOBase):
+    """
+    Text file compressing blocks of its text in parallel (the codecs release the GIL),
+    which are written in order as concatenated gzip members, zstd frames or lz4 frames.
+    The readers of the codecs read all members (or frames) of the file as one stream.
+    """
+
+    raw: BinaryIO
+    executor: ThreadPoolExecutor
+    compress: Callable[[bytes], bytes]
+    # maximum number of blocks compressed at once
+    window: int
+    buffer: list[str]
+    buffered: int
+    pending: deque[Future]
+
+    def __init__(
+        self,
+        path: Path,
+        compress: Callable[[bytes], bytes] = gzip.compress,
+        workers: int = 4,
+        append: bool = False,
+    ):
+        # the appended blocks are further members (or frames) of the file
+        self.raw = open(path, "ab" if append else "wb")
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="compress"
+        )
+        self.compress = compress
+        self.window = 2 * workers
+        self.buffer = []
+        self.buffered = 0
+        self.pending = deque()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.buffer.append(s)
+        self.buffered += len(s)
+        if self.buffered >= BLOCK_SIZE:
+            self.__submit()
+        return len(s)
+
+    def __submit(self):
+        block = "".join(self.buffer).encode()
+        self.buffer = []
+        self.buffered = 0
+        self.pending.append(self.executor.submit(self.compress, block))
+        while len(self.pending) > self.window:
+            self.raw.write(self.pending.popleft().result())
+
+    def flush(self):
+        """
+        Writes out the buffered text as a member (or frame) of its own.
+        """
+        if self.buffer:
+            self.__submit()
+        while self.pending:
+            self.raw.write(self.pending.popleft().result())
+        self.raw.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        # flushes the remaining text
+        super().close()
+        self.executor.shutdown()
+        self.raw.close()
@@ -3,6 +3,21 @@ from enum import Enum
 from pathlib import Path
 
 
+class JsonDecoder(Enum):
+    stdlib = "stdlib"
+    # optional, falls back to the stdlib if not installed
+    orjson = "orjson"
+    # optional, falls back to the stdlib if not installed
+    msgspec = "msgspec"
+
+    def __str__(self):
+        return self.name.lower()
+
+    @staticmethod
+    def parse(s: str):
+        return JsonDecoder[s]
+
+
 @dataclass
 class SpotifyConfig:
     client_id: str
@@ -15,12 +30,39 @@ class SpotifyConfig:
     # https://developer.spotify.com/documentation/web-api/concepts/rate-limits doesn't specify
     # a rate limit, but we try to be nice API citizens
     rate_limit_requests_per_bucket: int = 100
-    rate_limit_max_retries = 3
+    # maximum seconds a request waits for rate-limit errors to end before giving up
+    rate_limit_max_wait_seconds: int = 900
+    # adapt the request rate to the rate-limit errors, starting at the rate of the bucket
+    adaptive_rate_limit: bool = False
+    # requests/s gained per second without rate-limit errors, with the adaptive rate limit
+    rate_limit_increase = 0.1
+    # factor of the request rate after a rate-limit error, with the adaptive rate limit
+    rate_limit_decrease = 0.5
+    # directory of the HTTP response cache (disabled if not set)
+    cache_dir: Path | None = None
+    cache_max_bytes: int = 1024 * 1024 * 1024
+    # decoder of the JSON responses not validated by pydantic directly,
+    # the faster decoders require the optional `json` extra
+    json_decoder: JsonDecoder = JsonDecoder.stdlib
 
 
 class FileType(Enum):
     csv = "csv"
     csvgz = "csv.gz"
+    # requires zstandard
+    csvzst = "csv.zst"
+    # requires lz4
+    csvlz4 = "csv.lz4"
+    # requires pyarrow
+    parquet = "parquet"
+    # all tables in one database, upserted by their primary keys
+    sqlite = "sqlite"
+    # requires duckdb
+    duckdb = "duckdb"
+
+    @property
+    def is_database(self) -> bool:
+        return self in (FileType.sqlite, FileType.duckdb)
 
     def __str__(self):
         return self.name.lower()
@@ -30,9 +72,72 @@ class FileType(Enum):
         return FileType[s]
 
 
+class Engine(Enum):
+    threads = "threads"
+    asyncio = "asyncio"
+
+    def __str__(self):
+        return self.name.lower()
+
+    @staticmethod
+    def parse(s: str):
+        return Engine[s]
+
+
+class Pagination(Enum):
+    # follow the `next` URL one page at a time
+    next = "next"
+    # compute all offsets from the first page and fetch the pages in parallel
+    offset = "offset"
+
+    def __str__(self):
+        return self.name.lower()
+
+    @staticmethod
+    def parse(s: str):
+        return Pagination[s]
+
+
 @dataclass
 class Config:
     spotify: SpotifyConfig
     output_dir: Path = Path("output")
     category_ids: list[str] = field(default_factory=lambda: ["latin"])
     file_type: FileType = FileType.csvgz
+    # number of rows per row group of the Parquet tables, or per upsert of the databases
+    row_group_size: int = 100_000
+    # number of threads compressing blocks of the compressed tables
+    compression_workers: int = 4
+    # compression level of the compressed tables, the default level of the codec if None
+    compression_level: int | None = None
+    # number of playlists fetched concurrently (1 fetches sequentially)
+    workers: int = 1
+    # number of worker processes (1 downloads in this process)
+    processes: int = 1
+    engine: Engine = Engine.threads
+    pagination: Pagination = Pagination.next
+    # number of pages fetched in parallel per listing with the offset pagination
+    page_workers: int = 4
+    # SQLite file of the playlist snapshots, to skip downloading unchanged playlists
+    state_path: Path | None = None
+    # resolve the full artists in batches for the artists table
+    enrich_artists: bool = False
+    # resolve the full albums in batches for the albums table
+    enrich_albums: bool = False
+    # maximum seconds an album ID waits for its batch to fill up
+    album_batch_latency: float = 5.0
+    # only request the fields read by the record builders
+    project_fields: bool = False
+    # only validate the track fields read by the record builders
+    lean_models: bool = False
+    # maximum number of keys each builder keeps in memory before spilling them to disk
+    dedup_max_keys: int | None = None
+    # append the new rows to the tables, skipping the keys emitted by previous runs
+    append: bool = False
+    # write the tables into Hive-style partitions by category and fetch date
+    partitioned: bool = False
+    # the names of the tables to build, all of them if None
+    tables: list[str] | None = None
+
+    def selects(self, table_name: str) -> bool:
+        return self.tables is None or table_name in self.tables
@@ -0,0 +1,149 @@
+"""
+Database tables, upserted by their primary key so repeated runs update their rows in place.
+SQLite is used from the stdlib, DuckDB is an optional dependency only required by its file type.
+"""
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Any, Iterator
+
+from paddle.downloader.config import FileType
+from paddle.downloader.records import TableSchema
+
+# the time the rows were fetched, added to every table
+FETCHED_AT = "fetched_at"
+
+# the types of the columns by their Python type, other columns are text
+SQL_TYPES = {
+    str: "TEXT",
+    int: "BIGINT",
+    float: "DOUBLE",
+    bool: "BOOLEAN",
+    datetime: "TIMESTAMP",
+}
+# the declared types, as reported back by the databases
+PYTHON_TYPES = {
+    **{sql_type: t for t, sql_type in SQL_TYPES.items()},
+    "VARCHAR": str,
+}
+
+
+def connect(path: Path, file_type: FileType) -> Any:
+    """
+    Returns: a connection to the database in autocommit mode, the writers begin their transactions
+    """
+    match file_type:
+        case FileType.sqlite:
+            return sqlite3.connect(path, timeout=60, isolation_level=None)
+        case FileType.duckdb:
+            import duckdb
+
+            return duckdb.connect(str(path))
+
+
+class DatabaseWriter:
+    """
+    Buffers the rows of a table, which are upserted in one transaction per `batch_size` rows.
+    """
+
+    connection: Any
+    statement: str
+    batch_size: int
+    fetched_at: str
+    rows: list[tuple[Any, ...]]
+
+    def __init__(
+        self,
+        path: Path,
+        file_type: FileType,
+        table_name: str,
+        column_names: Iterable[str],
+        column_types: dict[str, type],
+        primary_key: Iterable[str],
+        batch_size: int,
+    ):
+        column_names = (*column_names, FETCHED_AT)
+        column_types = {**column_types, FETCHED_AT: datetime}
+        primary_key = tuple(primary_key)
+        columns = ", ".join(
+            f"{name} {SQL_TYPES[column_types.get(name, str)]}" for name in column_names
+        )
+        self.connection = connect(path, file_type)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table_name} "
+            f"({columns}, PRIMARY KEY ({', '.join(primary_key)}))"
+        )
+        updates = ", ".join(
+            f"{name} = excluded.{name}"
+            for name in column_names
+            if name not in primary_key
+        )
+        self.statement = (
+            f"INSERT INTO {table_name} ({', '.join(column_names)}) "
+            f"VALUES ({', '.join('?' for _ in column_names)}) "
+            f"ON CONFLICT ({', '.join(primary_key)}) DO UPDATE SET {updates}"
+        )
+        self.batch_size = batch_size
+        self.fetched_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.rows = []
+
+    def writerow(self, row: Iterable[Any]):
+        self.rows.append((*row, self.fetched_at))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def writerows(self, rows: Iterable[Iterable[Any]]):
+        fetched_at = self.fetched_at
+        self.rows.extend((*row, fetched_at) for row in rows)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.connection.execute("BEGIN")
+        self.connection.executemany(self.statement, self.rows)
+        self.connection.execute("COMMIT")
+        self.rows = []
+
+    def close(self):
+        if self.rows:
+            self.flush()
+        self.connection.close()
+
+
+def database_table_names(path: Path, file_type: FileType) -> list[str]:
+    connection = connect(path, file_type)
+    match file_type:
+        case FileType.sqlite:
+            query = "SELECT name FROM sqlite_master WHERE type = 'table'"
+        case FileType.duckdb:
+            query = "SHOW TABLES"
+    names = [name for (name,) in connection.execute(query).fetchall()]
+    connection.close()
+    return names
+
+
+def read_database_table(
+    path: Path, file_type: FileType, table_name: str
+) -> tuple[TableSchema, Iterator[tuple[Any, ...]]]:
+    """
+    Returns: the schema and the rows of a table, without their fetched_at column
+    """
+    connection = connect(path, file_type)
+    # (cid, name, type, notnull, default, pk) in both databases
+    info = connection.execute(f"PRAGMA table_info({table_name})").fetchall()
+    columns = [column for column in info if column[1] != FETCHED_AT]
+    schema = TableSchema(
+        column_names=[column[1] for column in columns],
+        column_types={column[1]: PYTHON_TYPES[column[2]] for column in columns},
+        primary_key=tuple(column[1] for column in columns if column[5]),
+    )
+
+    def rows() -> Iterator[tuple[Any, ...]]:
+        cursor = connection.execute(
+            f"SELECT {', '.join(schema.column_names)} FROM {table_name}"
+        )
+        while batch := cursor.fetchmany(1024):
+            yield from batch
+        connection.close()
+
+    return schema, rows()
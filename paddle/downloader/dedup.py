@@ -0,0 +1,268 @@
+"""
+Sets of the keys emitted by the record builders, used instead of plain sets when their memory
+must stay bounded (`dedup_max_keys`) or they persist across runs (`append`).
+Spotify IDs are 22 ASCII letters and digits, which are all digits of base64, so each ID is
+packed into 17 bytes by the base64 decoder, and a composite key into their concatenation.
+The keys held in memory are still kept in a set, where a packed ID only takes about a fifth
+less memory than its str: memory is bounded by spilling the keys to disk.
+"""
+import json
+import sqlite3
+from binascii import a2b_base64
+from pathlib import Path
+from typing import Iterator
+
+ID_LENGTH = 22
+# pads the 22 digits of an ID to the 24 digits of 18 bytes, the first of which is always zero
+ID_PADDING = "AA"
+WORD_MASK = (1 << 64) - 1
+
+Key = str | tuple[str, ...]
+
+
+def pack_id(sid: str) -> bytes | None:
+    """
+    Returns: the 17 bytes of a Spotify ID, None if it is not one
+    """
+    # the alphabet is exactly the ASCII letters and digits
+    if (
+        not isinstance(sid, str)
+        or len(sid) != ID_LENGTH
+        or not (sid.isascii() and sid.isalnum())
+    ):
+        return None
+    return a2b_base64(ID_PADDING + sid)[1:]
+
+
+def pack_key(key: Key) -> bytes | None:
+    """
+    Returns: the packed IDs of a key, None if any of them is not a Spotify ID
+    """
+    if isinstance(key, str):
+        return pack_id(key)
+    packed = [pack_id(sid) for sid in key]
+    return None if None in packed else b"".join(packed)
+
+
+class BloomFilter:
+    """
+    Bloom filter of packed keys, with about 1% false positives at its capacity.
+    """
+
+    # bits per key and number of hashes of about 1% false positives
+    BITS_PER_KEY = 10
+    HASHES = 7
+
+    capacity: int
+    num_bits: int
+    bits: bytearray
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.num_bits = self.BITS_PER_KEY * capacity
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def __positions(self, packed: bytes) -> Iterator[int]:
+        # double hashing, the filter is rebuilt by each process so the hashes may be randomized
+        h1 = hash(packed) & WORD_MASK
+        h2 = (h1 >> 32) | 1
+        for i in range(self.HASHES):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, packed: bytes):
+        for position in self.__positions(packed):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, packed: bytes) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.__positions(packed)
+        )
+
+
+class IdSet:
+    """
+    Set of Spotify IDs, or of composite keys of them, packed into bytes.
+    Keys which are not Spotify IDs are kept as they are. The keys held in memory are in a plain
+    set, so without `max_keys` the set takes about as much memory as a set of the str keys.
+
+    With `max_keys`, the packed keys spill into a SQLite file at `spill_path` whenever
+    `max_keys` are held in memory. A Bloom filter of the spilled keys answers most lookups of
+    new keys without reading the file, so memory stays at about 1.25 bytes per spilled key.
+    A `persistent` set writes its added keys into the file with each `commit` (and when closed),
+    and is reopened with them. Its uncommitted keys spill into a separate table, which is
+    only merged into the keys by `commit` and is discarded when the set is reopened.
+    """
+
+    # capacity of the Bloom filter without `max_keys`
+    BLOOM_CAPACITY = 1024 * 1024
+
+    keys: set[bytes]
+    other: set[Key]
+    max_keys: int | None
+    spill_path: Path | None
+    persistent: bool
+    spill: sqlite3.Connection | None = None
+    bloom: BloomFilter | None = None
+    spilled: int = 0
+    # the keys added since the last commit of a persistent set
+    added: list[bytes]
+    added_other: list[Key]
+    # the last looked up key and its packed IDs, as the builders add the keys they look up
+    last: tuple[Key | None, bytes | None] = (None, None)
+
+    def __init__(
+        self,
+        max_keys: int | None = None,
+        spill_path: Path | None = None,
+        persistent: bool = False,
+    ):
+        assert spill_path is not None or (max_keys is None and not persistent)
+        self.keys = set()
+        self.other = set()
+        self.added = []
+        self.added_other = []
+        self.max_keys = max_keys
+        self.spill_path = spill_path
+        self.persistent = persistent
+        if spill_path is None:
+            return
+        if not persistent:
+            # left over by a failed run
+            spill_path.unlink(missing_ok=True)
+        elif spill_path.exists():
+            self.__open()
+            self.spilled = self.spill.execute("SELECT count(*) FROM keys").fetchone()[0]
+            self.other = {
+                json_key(key) for (key,) in self.spill.execute("SELECT key FROM other")
+            }
+            self.__build_bloom(max(self.bloom.capacity, 2 * self.spilled))
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.other) + self.spilled
+
+    def __pack(self, key: Key) -> bytes | None:
+        last_key, packed = self.last
+        if key is not last_key:
+            packed = pack_key(key)
+            self.last = key, packed
+        return packed
+
+    def __contains__(self, key: Key) -> bool:
+        packed = self.__pack(key)
+        if packed is None:
+            return key in self.other
+        return packed in self.keys or self.__is_spilled(packed)
+
+    def add(self, key: Key) -> bool:
+        """
+        Returns: whether the key was added, i.e. it was not in the set
+        """
+        packed = self.__pack(key)
+        if packed is None:
+            if key in self.other:
+                return False
+            self.other.add(key)
+            if self.persistent:
+                self.added_other.append(key)
+            return True
+        if packed in self.keys or self.__is_spilled(packed):
+            return False
+        self.keys.add(packed)
+        if self.persistent:
+            self.added.append(packed)
+        if self.max_keys is not None and len(self.keys) >= self.max_keys:
+            self.__spill()
+        return True
+
+    def __is_spilled(self, packed: bytes) -> bool:
+        if self.bloom is None or packed not in self.bloom:
+            return False
+        row = self.spill.execute(
+            "SELECT 1 FROM keys WHERE key = ?1 UNION ALL SELECT 1 FROM pending WHERE key = ?1",
+            (packed,),
+        ).fetchone()
+        return row is not None
+
+    def __open(self):
+        self.spill = sqlite3.connect(self.spill_path)
+        self.spill.execute(
+            "CREATE TABLE IF NOT EXISTS keys (key BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+        # the keys which are not Spotify IDs, as JSON
+        self.spill.execute(
+            "CREATE TABLE IF NOT EXISTS other (key TEXT PRIMARY KEY) WITHOUT ROWID"
+        )
+        # the spilled keys of a persistent set whose rows are not written yet
+        self.spill.execute(
+            "CREATE TABLE IF NOT EXISTS pending (key BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+        with self.spill:
+            # left over by a failed run, whose rows were never written
+            self.spill.execute("DELETE FROM pending")
+        self.bloom = BloomFilter(
+            4 * self.max_keys if self.max_keys else self.BLOOM_CAPACITY
+        )
+
+    def __build_bloom(self, capacity: int):
+        self.bloom = BloomFilter(capacity)
+        for (key,) in self.spill.execute("SELECT key FROM keys"):
+            self.bloom.add(key)
+
+    def __spill(self):
+        if self.spill is None:
+            self.__open()
+        with self.spill:
+            if self.persistent:
+                # the committed keys are already in the file, the added ones wait for `commit`
+                self.spill.executemany(
+                    "INSERT OR IGNORE INTO pending VALUES (?)",
+                    ((packed,) for packed in self.added),
+                )
+            else:
+                self.spill.executemany(
+                    "INSERT INTO keys VALUES (?)", ((packed,) for packed in self.keys)
+                )
+        self.added = []
+        self.spilled += len(self.keys)
+        if self.spilled > self.bloom.capacity:
+            # rebuilt with twice the capacity, so false positives stay rare
+            self.__build_bloom(2 * self.bloom.capacity)
+        else:
+            for packed in self.keys:
+                self.bloom.add(packed)
+        self.keys = set()
+
+    def commit(self):
+        """
+        Writes the keys added since the last commit into the file of a persistent set.
+        """
+        assert self.persistent
+        if self.spill is None:
+            self.__open()
+        with self.spill:
+            self.spill.executemany(
+                "INSERT OR IGNORE INTO keys VALUES (?)",
+                ((packed,) for packed in self.added),
+            )
+            self.spill.execute("INSERT OR IGNORE INTO keys SELECT key FROM pending")
+            self.spill.execute("DELETE FROM pending")
+            self.spill.executemany(
+                "INSERT OR IGNORE INTO other VALUES (?)",
+                ((json.dumps(key),) for key in self.added_other),
+            )
+        self.added = []
+        self.added_other = []
+
+    def close(self):
+        if self.persistent:
+            self.commit()
+            self.spill.close()
+        elif self.spill is not None:
+            self.spill.close()
+            self.spill_path.unlink()
+
+
+def json_key(key: str) -> Key:
+    key = json.loads(key)
+    return key if isinstance(key, str) else tuple(key)
@@ -0,0 +1,142 @@
+import time
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from paddle.downloader.config import Config
+from paddle.downloader.rows import TrackRow
+
+# maximum number of IDs of the several artists endpoint
+ARTISTS_BATCH_SIZE = 50
+# maximum number of IDs of the several albums endpoint
+ALBUMS_BATCH_SIZE = 20
+
+
+class IdBatcher:
+    """
+    Collects unique IDs into batches for the endpoints fetching several objects at once.
+    IDs are only batched once per run, so no object is fetched twice.
+    With a `max_latency` (in seconds), a partial batch is returned as well once its oldest ID
+    waited that long, so pending IDs do not pile up while waiting for a full batch.
+    The latency is only checked when IDs are added, so the download loops also add an empty
+    list of IDs once per playlist, for the playlists without new IDs.
+    The batcher does no I/O itself, the batches are fetched by the engine's client.
+    """
+
+    batch_size: int
+    max_latency: float | None
+    seen: set[str]
+    pending: list[str]
+    pending_since: float
+
+    def __init__(self, batch_size: int, max_latency: float | None = None):
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.seen = set()
+        self.pending = []
+        self.pending_since = 0.0
+
+    def add(self, ids: Iterable[str]) -> Iterator[list[str]]:
+        """
+        Returns: the batches which are due (full or waiting too long) after adding the given IDs
+        """
+        for sid in ids:
+            if sid in self.seen:
+                continue
+            self.seen.add(sid)
+            if not self.pending:
+                self.pending_since = time.monotonic()
+            self.pending.append(sid)
+            if len(self.pending) >= self.batch_size:
+                yield self.__take()
+        if (
+            self.pending
+            and self.max_latency is not None
+            and time.monotonic() - self.pending_since >= self.max_latency
+        ):
+            yield self.__take()
+
+    def flush(self) -> Iterator[list[str]]:
+        """
+        Returns: the remaining partial batch, if any
+        """
+        if self.pending:
+            yield self.__take()
+
+    def reset(self):
+        """
+        Forgets the batched IDs, once the remaining batch is flushed.
+        """
+        assert not self.pending
+        self.seen = set()
+
+    def __take(self) -> list[str]:
+        batch = self.pending
+        self.pending = []
+        return batch
+
+
+def artist_ids(rows: Iterable[TrackRow]) -> Iterator[str]:
+    for row in rows:
+        yield from row.artist_ids
+
+
+def album_ids(rows: Iterable[TrackRow]) -> Iterator[str]:
+    for row in rows:
+        if row.type == "track":
+            yield row.album_id
+
+
+@dataclass
+class Enrichment:
+    """
+    Batchers of the objects to enrich, None if not enabled.
+    When `partitioned`, the objects are enriched per category, into its partition.
+    """
+
+    artists: IdBatcher | None = None
+    albums: IdBatcher | None = None
+    partitioned: bool = False
+
+    @staticmethod
+    def from_config(config: Config) -> "Enrichment | None":
+        # only the selected tables are enriched
+        enrich_artists = config.enrich_artists and config.selects("artists_records")
+        enrich_albums = config.enrich_albums and config.selects("albums_records")
+        if not (enrich_artists or enrich_albums):
+            return None
+        return Enrichment(
+            artists=IdBatcher(ARTISTS_BATCH_SIZE) if enrich_artists else None,
+            albums=IdBatcher(ALBUMS_BATCH_SIZE, max_latency=config.album_batch_latency)
+            if enrich_albums
+            else None,
+            partitioned=config.partitioned,
+        )
+
+    def start_category(self):
+        """
+        Forgets the enriched objects of the previous category, which are enriched again
+        into the partition of the next one. Its remaining batches must be flushed first.
+        """
+        for batcher in (self.artists, self.albums):
+            if batcher is not None:
+                batcher.reset()
+
+    def artist_batches(self, rows: list[TrackRow] | None) -> Iterator[list[str]]:
+        """
+        Returns: the batches due after adding the rows, or all remaining batches without rows
+        """
+        if self.artists is None:
+            return iter(())
+        if rows is None:
+            return self.artists.flush()
+        return self.artists.add(artist_ids(rows))
+
+    def album_batches(self, rows: list[TrackRow] | None) -> Iterator[list[str]]:
+        """
+        Returns: the batches due after adding the rows, or all remaining batches without rows
+        """
+        if self.albums is None:
+            return iter(())
+        if rows is None:
+            return self.albums.flush()
+        return self.albums.add(album_ids(rows))
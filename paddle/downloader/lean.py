@@ -0,0 +1,100 @@
+"""
+Lean models, generated from the models in `models.py` with only the fields read by the builders.
+All other fields are ignored while validating, so no objects are built for them
+(e.g. the available markets, images and external URLs of every track).
+"""
+import copy
+import functools
+import types
+import typing
+from dataclasses import dataclass
+from typing import Annotated, List, Union
+
+from pydantic import BaseModel, TypeAdapter, create_model
+
+from paddle.downloader.config import Config
+from paddle.downloader.models import Page, PlaylistDetails, PlaylistTrack
+from paddle.downloader.projection import FieldTree, paths_tree
+from paddle.downloader.records import RecordBuilder
+
+# kept in every lean model, as the unions of models are discriminated by their type
+DISCRIMINATOR = "type"
+
+
+def lean_annotation(annotation: typing.Any, tree: FieldTree) -> typing.Any:
+    """
+    Returns: the annotation with its models replaced by lean models of the tree
+    """
+    if not tree:
+        return annotation
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return lean_model(annotation, tree)
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is list:
+        return List[lean_annotation(args[0], tree)]
+    if origin in (typing.Union, types.UnionType):
+        return Union[tuple(lean_annotation(arg, tree) for arg in args)]
+    if origin is Annotated:
+        return Annotated[(lean_annotation(args[0], tree), *annotation.__metadata__)]
+    return annotation
+
+
+def lean_model(model: type[BaseModel], tree: FieldTree) -> type[BaseModel]:
+    """
+    Returns: a model with only the fields of the tree, which are validated like in the given model
+    """
+    fields = {
+        # the field is copied, as pydantic sets the lean annotation on it
+        name: (lean_annotation(field.annotation, tree.get(name, {})), copy.copy(field))
+        for name, field in model.model_fields.items()
+        if name in tree or name == DISCRIMINATOR
+    }
+    return create_model(f"Lean{model.__name__}", **fields)
+
+
+@dataclass(frozen=True)
+class TrackModels:
+    """
+    The models the playlist tracks are validated with.
+    """
+
+    # the model of a playlist track, like PlaylistTrack
+    track: type[BaseModel]
+    tracks_page: TypeAdapter
+    playlist_details: TypeAdapter
+
+    @staticmethod
+    def create(track: type[BaseModel] = PlaylistTrack) -> "TrackModels":
+        details = PlaylistDetails
+        if track is not PlaylistTrack:
+            details = create_model(
+                "LeanPlaylistDetails",
+                __base__=PlaylistDetails,
+                tracks=(Page[track], ...),
+            )
+        return TrackModels(
+            track=track,
+            tracks_page=TypeAdapter(Page[track]),
+            playlist_details=TypeAdapter(details),
+        )
+
+    @staticmethod
+    @functools.cache
+    def lean(track_paths: tuple[str, ...]) -> "TrackModels":
+        """
+        The models are created once per set of paths, so all clients and stores share them.
+
+        Args:
+            track_paths: the dotted paths read from each PlaylistTrack
+        """
+        return TrackModels.create(lean_model(PlaylistTrack, paths_tree(track_paths)))
+
+    @staticmethod
+    def from_config(config: Config, builder: RecordBuilder) -> "TrackModels":
+        if config.lean_models:
+            return TrackModels.lean(builder.track_paths)
+        return FULL_TRACK_MODELS
+
+
+FULL_TRACK_MODELS = TrackModels.create()
@@ -1,24 +1,40 @@
 import argparse
+import asyncio
 import logging
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import Sequence
+from typing import Sequence, Iterable, Iterator
 
 from paddle.downloader.client import SpotifyClient
-from paddle.downloader.config import Config, SpotifyConfig, FileType
-from paddle.downloader.records import (
-    RecordBuilder,
-    CategoryPlaylistRecords,
-    PlaylistRecords,
-    TracksRecords,
-    PlaylistTrackIdRecords,
-    TrackArtistIdRecords,
-    ArtistsRecords,
+from paddle.downloader.config import (
+    Config,
+    SpotifyConfig,
+    FileType,
+    Engine,
+    Pagination,
+    JsonDecoder,
 )
+from paddle.downloader.enrichment import Enrichment
+from paddle.downloader.lean import TrackModels
+from paddle.downloader.models import Playlist, SimplifiedPlaylist
+from paddle.downloader.pagination import ordered_map, prefetch
+from paddle.downloader.projection import Projection
+from paddle.downloader.records import RecordBuilder, AlbumsRecords, TABLE_BUILDERS
+from paddle.downloader.rows import TrackRow, PlaylistCounts
 from paddle.downloader.session import SpotifySessionCreator
+from paddle.downloader.state import SnapshotStore
 
 logger = logging.getLogger(__name__)
 
+# the rows of a sequential run are fetched ahead of the builders in chunks of a tracks page,
+# and at most that many chunks ahead
+PREFETCH_CHUNK_ROWS = 100
+PREFETCH_CHUNKS = 10
+
 
 def main(args: Sequence[str] | None = None):
     parser = argparse.ArgumentParser(
@@ -32,11 +48,31 @@ def main(args: Sequence[str] | None = None):
     parser.add_argument(
         "-f",
         "--file-type",
-        help="Output filetype",
+        help="Output filetype (csvzst requires zstandard, csvlz4 requires lz4, "
+        "parquet requires pyarrow, duckdb requires duckdb)",
         default=FileType.csvgz,
         type=FileType.parse,
         choices=list(FileType),
     )
+    parser.add_argument(
+        "--row-group-size",
+        help="Number of rows per row group of the Parquet tables, or per upsert of the databases",
+        default=Config.row_group_size,
+        type=int,
+    )
+    parser.add_argument(
+        "--compression-level",
+        help="Compression level of the compressed tables (gzip: 1-9, zstd: 1-22, lz4: 0-16), "
+        "the default level of the codec if not set",
+        default=Config.compression_level,
+        type=int,
+    )
+    parser.add_argument(
+        "--compression-workers",
+        help="Number of threads compressing blocks of the compressed tables",
+        default=Config.compression_workers,
+        type=int,
+    )
     parser.add_argument(
         "-c", "--category", nargs="+", help="Categories to download", default=["latin"]
     )
@@ -46,6 +82,133 @@ def main(args: Sequence[str] | None = None):
         default=SpotifyConfig.rate_limit_requests_per_bucket,
         type=int,
     )
+    parser.add_argument(
+        "--json-decoder",
+        help="Decoder of the JSON responses, falls back to the stdlib if not installed",
+        default=SpotifyConfig.json_decoder,
+        type=JsonDecoder.parse,
+        choices=list(JsonDecoder),
+    )
+    parser.add_argument(
+        "--adaptive-rate-limit",
+        help="Adapt the request rate to the rate-limit errors, starting at --rate-limit",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--rate-limit-max-wait",
+        help="Maximum seconds a request waits for rate-limit errors to end before the run "
+        "fails. The rate-limited requests are parked on the threads fetching the playlists, "
+        "while the fetched playlists keep being processed",
+        default=SpotifyConfig.rate_limit_max_wait_seconds,
+        type=int,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of playlists to fetch concurrently",
+        default=Config.workers,
+        type=int,
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        help="Number of worker processes sharing the playlists (with the threads engine)",
+        default=Config.processes,
+        type=int,
+    )
+    parser.add_argument(
+        "--engine",
+        help="Download engine (asyncio requires httpx)",
+        default=Config.engine,
+        type=Engine.parse,
+        choices=list(Engine),
+    )
+    parser.add_argument(
+        "--pagination",
+        help="Follow the next page URLs, or fetch all page offsets in parallel",
+        default=Config.pagination,
+        type=Pagination.parse,
+        choices=list(Pagination),
+    )
+    parser.add_argument(
+        "--page-workers",
+        help="Number of pages fetched in parallel per listing with the offset pagination",
+        default=Config.page_workers,
+        type=int,
+    )
+    parser.add_argument(
+        "--state",
+        help="SQLite file storing the playlist snapshots; unchanged playlists are not downloaded again",
+        default=Config.state_path,
+        type=Path,
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory of the HTTP response cache, revalidated with ETags",
+        default=SpotifyConfig.cache_dir,
+        type=Path,
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        help="Maximum size of the HTTP response cache in MiB",
+        default=SpotifyConfig.cache_max_bytes // 1024**2,
+        type=int,
+    )
+    parser.add_argument(
+        "--enrich-artists",
+        help="Fetch the full artists (followers, genres, popularity, image) in batches",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--enrich-albums",
+        help="Fetch the full albums in batches into an albums table",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--album-batch-latency",
+        help="Maximum seconds an album waits for its batch to fill up",
+        default=Config.album_batch_latency,
+        type=float,
+    )
+    parser.add_argument(
+        "--lean-models",
+        help="Only validate the track fields written to the tables",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--project-fields",
+        help="Only request the playlist and track fields written to the tables",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--dedup-max-keys",
+        help="Maximum number of row keys each table keeps in memory before spilling them to "
+        "disk, where only a Bloom filter of about 1.25 bytes per key stays in memory "
+        "(by default, all keys stay in memory)",
+        default=Config.dedup_max_keys,
+        type=int,
+    )
+    parser.add_argument(
+        "--append",
+        help="Append only the rows never emitted before to the tables, "
+        "keeping an index of the emitted keys in the output directory",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--tables",
+        nargs="+",
+        choices=list(TABLE_BUILDERS),
+        metavar="TABLE",
+        help=f"Tables to build ({', '.join(TABLE_BUILDERS)}), all by default. "
+        "Only the requests and fields read by the selected tables are fetched",
+        default=Config.tables,
+    )
+    parser.add_argument(
+        "--partitioned",
+        help="Write each table into partitions: "
+        "<table>/category=<category>/fetched_date=<date>/part-<n>",
+        action="store_true",
+    )
     result_args = parser.parse_args(args)
 
     client_id = os.environ["SPOTIFY_CLIENT_ID"]
@@ -54,11 +217,35 @@ def main(args: Sequence[str] | None = None):
         client_id=client_id,
         client_secret=client_secret,
         rate_limit_requests_per_bucket=result_args.rate_limit,
+        adaptive_rate_limit=result_args.adaptive_rate_limit,
+        rate_limit_max_wait_seconds=result_args.rate_limit_max_wait,
+        json_decoder=result_args.json_decoder,
+        cache_dir=result_args.cache_dir,
+        cache_max_bytes=result_args.cache_max_size * 1024**2,
     )
     config = Config(
         spotify=spotify_config,
         output_dir=result_args.output,
+        category_ids=result_args.category,
         file_type=result_args.file_type,
+        row_group_size=result_args.row_group_size,
+        compression_workers=result_args.compression_workers,
+        compression_level=result_args.compression_level,
+        workers=result_args.workers,
+        processes=result_args.processes,
+        engine=result_args.engine,
+        pagination=result_args.pagination,
+        page_workers=result_args.page_workers,
+        state_path=result_args.state,
+        enrich_artists=result_args.enrich_artists,
+        enrich_albums=result_args.enrich_albums,
+        album_batch_latency=result_args.album_batch_latency,
+        project_fields=result_args.project_fields,
+        lean_models=result_args.lean_models,
+        dedup_max_keys=result_args.dedup_max_keys,
+        append=result_args.append,
+        partitioned=result_args.partitioned,
+        tables=result_args.tables,
     )
     run(config)
 
@@ -68,43 +255,347 @@ def run(config: Config):
     assert (
         config.output_dir.exists()
     ), f"Output directory {config.output_dir} must exist"
-    session_creator = SpotifySessionCreator(config=config.spotify)
-    session = session_creator.create_session()
-    client = SpotifyClient(session=session)
-    builder = RecordBuilder(
-        builders=[
-            CategoryPlaylistRecords(config=config),
-            PlaylistRecords(config=config),
-            TracksRecords(config=config),
-            PlaylistTrackIdRecords(config=config),
-            TrackArtistIdRecords(config=config),
-            ArtistsRecords(config=config),
-        ]
-    )
-    for category_id in config.category_ids:
-        logger.info(f"Starting to process category: '{category_id}'")
-        fetch_playlists(client, builder, category_id)
+    assert (
+        not config.append or config.processes == 1
+    ), "Appending is not supported with multiple processes"
+    assert (
+        not config.partitioned or config.processes == 1
+    ), "Partitioning is not supported with multiple processes"
+    if config.processes > 1:
+        # the worker processes build their own records, which are merged at the end
+        from paddle.downloader import processes
+
+        processes.download(config)
+        logger.info("Finished processing")
+        return
+    builder = create_record_builder(config)
+    store = create_snapshot_store(config)
+    match config.engine:
+        case Engine.threads:
+            download(config, builder, store=store)
+        case Engine.asyncio:
+            # httpx is an optional dependency only required by this engine
+            from paddle.downloader import aio
+
+            asyncio.run(aio.download(config, builder, store=store))
     builder.close()
+    if store is not None:
+        store.close()
     logger.info("Finished processing")
 
 
-def fetch_playlists(client: SpotifyClient, builder: RecordBuilder, category_id: str):
+def download(
+    config: Config, builder: RecordBuilder, store: SnapshotStore | None = None
+):
+    enrichment = Enrichment.from_config(config)
+    with open_client(config, builder) as client:
+        for category_id in config.category_ids:
+            logger.info(f"Starting to process category: '{category_id}'")
+            if enrichment is not None and enrichment.partitioned:
+                # the enriched rows of the previous category are written into its partition
+                enrich(client, builder, enrichment)
+                enrichment.start_category()
+            builder.start_category(category_id)
+            fetch_playlists(
+                client,
+                builder,
+                category_id,
+                workers=config.workers,
+                store=store,
+                enrichment=enrichment,
+            )
+        if enrichment is not None:
+            enrich(client, builder, enrichment)
+
+
+@contextmanager
+def open_client(
+    config: Config, builder: RecordBuilder | None = None
+) -> Iterator[SpotifyClient]:
+    """
+    Creates a client with its own session (and thus rate-limiter) and page executor.
+    The fields are projected on, and validated with models of, those read by the builder if enabled.
+    """
+    session_creator = SpotifySessionCreator(config=config.spotify)
+    session = session_creator.create_session()
+    with ThreadPoolExecutor(
+        max_workers=config.page_workers, thread_name_prefix="page"
+    ) as page_executor:
+        client = SpotifyClient(session=session)
+        if config.pagination == Pagination.offset:
+            client.page_executor = page_executor
+            client.page_window = config.page_workers
+        if builder is not None:
+            client.track_models = TrackModels.from_config(config, builder)
+        if config.project_fields and builder is not None:
+            client.projection = Projection.create(
+                builder.playlist_paths,
+                builder.track_paths,
+                track_model=client.track_models.track,
+            )
+        yield client
+    session.close()
+
+
+def create_snapshot_store(config: Config) -> SnapshotStore | None:
+    if config.state_path is None:
+        return None
+    return SnapshotStore(config.state_path)
+
+
+def create_record_builder(config: Config) -> RecordBuilder:
+    """
+    Returns: the builders of the selected tables, all of them by default
+        (the albums table only if the albums are enriched)
+    """
+    if (
+        config.tables is not None
+        and AlbumsRecords.table_name in config.tables
+        and not config.enrich_albums
+    ):
+        raise ValueError(f"{AlbumsRecords.table_name} requires enriching the albums")
+    builders = [
+        builder(config=config)
+        for name, builder in TABLE_BUILDERS.items()
+        if config.selects(name)
+        and (builder is not AlbumsRecords or config.enrich_albums)
+    ]
+    return RecordBuilder(builders=builders)
+
+
+def fetch_playlists(
+    client: SpotifyClient,
+    builder: RecordBuilder,
+    category_id: str,
+    workers: int = 1,
+    store: SnapshotStore | None = None,
+    enrichment: Enrichment | None = None,
+):
     playlist_ids = set()
-    playlists = client.get_playlists(category_id)
-    for item in playlists:
-        if item.id in playlist_ids:
-            logger.info(f"Ignoring duplicate playlist ID: {item.id}")
-            continue
-        playlist_ids.add(item.id)
-        logger.info(f"Fetched playlist ID: {item.id}")
-        playlist_client = client.get_playlist(item.id)
-        playlist = playlist_client.playlist
-        tracks = []
-        for track in playlist_client.get_tracks():
-            builder.add_track(playlist, track)
-            tracks.append(track)
-        builder.add_playlist(playlist, tracks)
-        logger.info(
-            f"Finished processing of playlist ID: {item.id} with {len(tracks)} tracks"
-        )
+
+    def unique_playlists() -> Iterator[SimplifiedPlaylist]:
+        for item in client.get_playlists(category_id):
+            if item.id in playlist_ids:
+                logger.info(f"Ignoring duplicate playlist ID: {item.id}")
+                continue
+            playlist_ids.add(item.id)
+            logger.info(f"Fetched playlist ID: {item.id}")
+            yield item
+
+    process_playlists(client, builder, unique_playlists(), workers, store, enrichment)
     logger.info(f"Downloaded {len(playlist_ids)} playlists")
+
+
+def process_playlists(
+    client: SpotifyClient,
+    builder: RecordBuilder,
+    playlists: Iterable[SimplifiedPlaylist],
+    workers: int = 1,
+    store: SnapshotStore | None = None,
+    enrichment: Enrichment | None = None,
+):
+    """
+    Downloads the listed playlists and adds them to the records.
+    """
+    if not builder.reads_tracks:
+        process_details(client, builder, playlists, workers)
+        return
+    if workers > 1:
+        downloads = download_concurrently(client, playlists, workers, store)
+    else:
+        downloads = download_ahead(client, playlists, store)
+    for playlist, rows in downloads:
+        if store is not None:
+            # the store keeps all rows of the playlist, the builders only stream them
+            rows = list(rows)
+        if enrichment is not None:
+            build_records(
+                builder, playlist, enrich_rows(client, builder, enrichment, rows)
+            )
+        else:
+            build_records(builder, playlist, rows)
+        if store is not None:
+            store.put(playlist, rows)
+
+
+def process_details(
+    client: SpotifyClient,
+    builder: RecordBuilder,
+    playlists: Iterable[SimplifiedPlaylist],
+    workers: int = 1,
+):
+    """
+    Adds the listed playlists to the records without their tracks, when no builder reads them.
+    Only the playlist details are fetched, so neither the tracks pages nor the snapshots are used.
+    """
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="playlist"
+    ) as executor:
+        for playlist, counts in ordered_map(
+            executor,
+            lambda item: fetch_details(client, item),
+            playlists,
+            window=2 * workers,
+        ):
+            builder.end_playlist(playlist, counts)
+            logger.info(
+                f"Finished processing of playlist ID: {playlist.id} "
+                f"with {counts.items} tracks"
+            )
+
+
+def fetch_details(
+    client: SpotifyClient, item: SimplifiedPlaylist
+) -> tuple[Playlist, PlaylistCounts]:
+    """
+    Returns: the playlist details, with the number of its items from its first tracks page
+    """
+    playlist_client = client.get_playlist(item.id)
+    return playlist_client.playlist, PlaylistCounts.from_total(
+        playlist_client.tracks_page.total
+    )
+
+
+def build_records(
+    builder: RecordBuilder, playlist: Playlist, rows: Iterable[TrackRow]
+) -> PlaylistCounts:
+    counts = PlaylistCounts()
+    for row in rows:
+        builder.add_track(playlist, row)
+        counts.add(row)
+    builder.end_playlist(playlist, counts)
+    logger.info(
+        f"Finished processing of playlist ID: {playlist.id} with {counts.items} tracks"
+    )
+    return counts
+
+
+def enrich(
+    client: SpotifyClient,
+    builder: RecordBuilder,
+    enrichment: Enrichment,
+    rows: list[TrackRow] | None = None,
+):
+    """
+    Resolves the artists and albums batches due after adding the track rows
+    (with no rows, only the partial batches waiting too long),
+    or all remaining batches at the end of the run (without rows).
+    """
+    for batch in enrichment.artist_batches(rows):
+        builder.add_artists(client.get_artists(batch))
+    for batch in enrichment.album_batches(rows):
+        builder.add_albums(client.get_albums(batch))
+
+
+def enrich_rows(
+    client: SpotifyClient,
+    builder: RecordBuilder,
+    enrichment: Enrichment,
+    rows: Iterable[TrackRow],
+) -> Iterator[TrackRow]:
+    """
+    Yields the rows, resolving the batches due after each row while streaming them,
+    and once more after the playlist, so its batches are due even without rows.
+    """
+    for row in rows:
+        yield row
+        enrich(client, builder, enrichment, [row])
+    enrich(client, builder, enrichment, [])
+
+
+def get_stored_playlist(
+    item: SimplifiedPlaylist, store: SnapshotStore | None
+) -> tuple[Playlist, list[TrackRow]] | None:
+    """
+    Returns: the stored playlist and track rows, if the snapshot of the listed playlist is unchanged
+    """
+    if store is None:
+        return None
+    stored = store.get(item.id, item.snapshot_id)
+    if stored is not None:
+        logger.info(f"Re-using unchanged snapshot of playlist ID: {item.id}")
+    return stored
+
+
+def open_playlist(
+    client: SpotifyClient,
+    item: SimplifiedPlaylist,
+    store: SnapshotStore | None = None,
+) -> tuple[Playlist, Iterable[TrackRow]]:
+    """
+    Fetches the playlist details and returns the rows of its lazily paginated tracks,
+    unless the playlist is unchanged in the store.
+    """
+    stored = get_stored_playlist(item, store)
+    if stored is not None:
+        return stored
+    playlist_client = client.get_playlist(item.id)
+    return playlist_client.playlist, map(TrackRow.create, playlist_client.get_tracks())
+
+
+def download_playlist(
+    client: SpotifyClient,
+    item: SimplifiedPlaylist,
+    store: SnapshotStore | None = None,
+) -> tuple[Playlist, list[TrackRow]]:
+    """
+    Fetches the playlist details and the rows of all of its track pages.
+    """
+    playlist, rows = open_playlist(client, item, store)
+    return playlist, list(rows)
+
+
+def download_ahead(
+    client: SpotifyClient,
+    playlists: Iterable[SimplifiedPlaylist],
+    store: SnapshotStore | None = None,
+) -> Iterator[tuple[Playlist, Iterator[TrackRow]]]:
+    """
+    Downloads the playlists sequentially on a background thread, while their rows are streamed
+    to the caller, so the fetched rows are still processed while a request is parked by
+    a rate limit. At most PREFETCH_CHUNKS chunks of rows are fetched ahead.
+    """
+
+    def fetch() -> Iterator[Playlist | list[TrackRow] | None]:
+        # each playlist is followed by the chunks of its rows, and None
+        for item in playlists:
+            playlist, rows = open_playlist(client, item, store)
+            yield playlist
+            rows = iter(rows)
+            while chunk := list(islice(rows, PREFETCH_CHUNK_ROWS)):
+                yield chunk
+            yield None
+
+    fetched = prefetch(fetch(), size=PREFETCH_CHUNKS)
+
+    def playlist_rows() -> Iterator[TrackRow]:
+        while (chunk := next(fetched)) is not None:
+            yield from chunk
+
+    for playlist in fetched:
+        rows = playlist_rows()
+        yield playlist, rows
+        # the rows which were not consumed
+        deque(rows, maxlen=0)
+
+
+def download_concurrently(
+    client: SpotifyClient,
+    playlists: Iterable[SimplifiedPlaylist],
+    workers: int,
+    store: SnapshotStore | None = None,
+) -> Iterator[tuple[Playlist, list[TrackRow]]]:
+    """
+    Downloads playlists on a pool of `workers` threads sharing the session (and thus its rate-limiter).
+    Results are yielded in the order of `playlists`, so the resulting records are identical
+    to a sequential run. At most `2 * workers` playlists are buffered at any time.
+    """
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="playlist"
+    ) as executor:
+        yield from ordered_map(
+            executor,
+            lambda item: download_playlist(client, item, store),
+            playlists,
+            window=2 * workers,
+        )
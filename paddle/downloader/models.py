@@ -1,10 +1,13 @@
 from datetime import datetime
 from enum import Enum
-from typing import Literal, List, Annotated, Any
+from typing import Literal, List, Annotated, Any, Generic, TypeVar
 
 from pydantic import BaseModel, Field, PositiveInt
 
 
+T = TypeVar("T")
+
+
 class ExternalUrls(BaseModel):
     spotify: str
 
@@ -59,9 +62,10 @@ class Restrictions(BaseModel):
 
 
 class ExternalIds(BaseModel):
-    isrc: str
-    ean: str
-    upc: str
+    # only the identifiers applicable to the object are returned (e.g. upc for albums)
+    isrc: str | None = None
+    ean: str | None = None
+    upc: str | None = None
 
 
 class AlbumGroup(str, Enum):
@@ -96,7 +100,8 @@ class Album(BaseModel):
     type: Literal["album"]
     album_type: AlbumGroup
     total_tracks: int
-    available_markets: List[str]
+    # optional, as it is only returned without a market and rarely requested with a projection
+    available_markets: List[str] | None = None
     external_urls: ExternalUrls
     href: str
     id: str
@@ -127,7 +132,8 @@ class SimplifiedTrack(BaseModel):
     type: Literal["track"]
     album: Album
     artists: List[SimplifiedArtist]
-    available_markets: List[str]
+    # optional, as it is only returned without a market and rarely requested with a projection
+    available_markets: List[str] | None = None
     disc_number: PositiveInt
     duration_ms: int
     explicit: bool
@@ -179,3 +185,40 @@ class Playlist(SimplifiedPlaylist):
     followers: Followers
     # Tracks are parsed separately
     # tracks: List[PlaylistTrack]
+
+
+class Page(BaseModel, Generic[T]):
+    """
+    Paging object of the Spotify API, validated as a whole from the response bytes.
+    """
+
+    href: str | None = None
+    items: List[T]
+    limit: int
+    next: str | None = None
+    offset: int
+    previous: str | None = None
+    total: int
+
+
+class CategoryPlaylists(BaseModel):
+    playlists: Page[SimplifiedPlaylist]
+
+
+class PlaylistDetails(Playlist):
+    """
+    Playlist details as returned with the first page of their tracks.
+    """
+
+    tracks: Page[PlaylistTrack]
+
+    def to_playlist(self) -> Playlist:
+        """
+        Returns: the playlist without its tracks, without validating it again
+        """
+        fields = {
+            name: getattr(self, name)
+            for name in Playlist.model_fields
+            if name != "tracks"
+        }
+        return Playlist.model_construct(**fields)
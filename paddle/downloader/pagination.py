@@ -0,0 +1,143 @@
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from queue import Queue, Full
+from typing import Iterator, Iterable, Callable, TypeVar
+from urllib.parse import urlsplit, parse_qsl, urlencode, urlunsplit
+
+from pydantic import TypeAdapter
+from requests import Session
+
+from paddle.downloader.models import Page
+from paddle.downloader.session import get_response_model
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def ordered_map(
+    executor: Executor, fn: Callable[[T], R], items: Iterable[T], window: int
+) -> Iterator[R]:
+    """
+    Like `executor.map`, but consumes `items` lazily and keeps at most `window` results pending.
+    Results are yielded in the order of `items`.
+    """
+    pending: deque[Future] = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def prefetch(items: Iterable[T], size: int) -> Iterator[T]:
+    """
+    Iterates over `items` on a background thread, at most `size` items ahead of the consumer,
+    which thus keeps processing the fetched items while the iteration blocks.
+    Errors of the iteration are raised to the consumer.
+    """
+    queue: Queue[tuple[bool, T | BaseException | None]] = Queue(maxsize=size)
+    stopped = threading.Event()
+
+    def put(entry: tuple[bool, T | BaseException | None]) -> bool:
+        # the consumer may stop before the end of the items
+        while not stopped.is_set():
+            try:
+                queue.put(entry, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((False, item)):
+                    return
+            put((True, None))
+        except BaseException as e:
+            put((True, e))
+
+    threading.Thread(target=produce, name="prefetch", daemon=True).start()
+    try:
+        while True:
+            end, item = queue.get()
+            if end:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def set_query(url: str, params: dict[str, str]) -> str:
+    """
+    Returns: the URL with the given query parameters added or replaced
+    """
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update(params)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def offset_urls(page: Page) -> list[str]:
+    """
+    Computes the URLs of all remaining pages from the `total` and `limit` of the given page.
+    The URLs are derived from its `next` URL, so any further query parameters are kept.
+    """
+    if page.next is None:
+        return []
+    return [
+        set_query(page.next, {"offset": str(offset), "limit": str(page.limit)})
+        for offset in range(page.offset + page.limit, page.total, page.limit)
+    ]
+
+
+def get_page(
+    session: Session, url: str, adapter: TypeAdapter, key: str | None = None
+) -> Page:
+    """
+    Args:
+        adapter: validates the whole response, i.e. the page or the object wrapping it
+        key: the attribute of the page in the validated response, if it is wrapped
+    """
+    data = get_response_model(session.get(url), adapter)
+    return getattr(data, key) if key is not None else data
+
+
+def get_pages(
+    session: Session,
+    page: Page,
+    adapter: TypeAdapter,
+    key: str | None = None,
+    executor: Executor | None = None,
+    window: int = 1,
+    params: dict[str, str] | None = None,
+) -> Iterator[Page]:
+    """
+    Yields the given page and all following pages in order.
+
+    Without an executor, the `next` URLs are followed one page at a time.
+    Otherwise, all remaining offsets are computed from the first page and fetched on the executor
+    with at most `window` pages in flight.
+
+    Args:
+        adapter: validates the following responses, see `get_page`
+        key: the attribute of the page in the validated response (e.g. "playlists"), if it is wrapped
+        params: query parameters set on every following page URL (e.g. the `fields` projection)
+    """
+
+    def fetch(url: str) -> Page:
+        return get_page(
+            session, set_query(url, params) if params else url, adapter, key
+        )
+
+    yield page
+    if executor is None:
+        while page.next is not None:
+            page = fetch(page.next)
+            yield page
+    else:
+        yield from ordered_map(executor, fetch, offset_urls(page), window)
@@ -0,0 +1,101 @@
+"""
+Parquet tables, written with pyarrow (an optional dependency only required by this file type).
+The rows of each table are buffered by column and written as row groups with typed columns.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Any, Iterator
+
+from paddle.downloader.records import TableSchema
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# the types of the columns by their Python type, other columns are strings
+ARROW_TYPES = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp("us", tz="UTC"),
+}
+
+
+def to_datetime(value: str | datetime | None) -> datetime | None:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class ParquetWriter:
+    """
+    Buffers the rows of a table into columns, which are flushed as row groups of `row_group_size`.
+    """
+
+    writer: pq.ParquetWriter
+    schema: pa.Schema
+    row_group_size: int
+    columns: list[list[Any]]
+
+    def __init__(
+        self,
+        path: Path,
+        column_names: Iterable[str],
+        column_types: dict[str, type],
+        row_group_size: int,
+    ):
+        self.schema = pa.schema(
+            [(name, ARROW_TYPES[column_types.get(name, str)]) for name in column_names]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self.columns = [[] for _ in self.schema]
+
+    def writerow(self, row: Iterable[Any]):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+        if len(self.columns[0]) >= self.row_group_size:
+            self.flush()
+
+    def writerows(self, rows: Iterable[Iterable[Any]]):
+        for column, values in zip(self.columns, zip(*rows)):
+            column.extend(values)
+        # only full row groups are flushed, the remaining rows start the next one
+        size = len(self.columns[0]) // self.row_group_size * self.row_group_size
+        if size:
+            self.flush(size)
+
+    def flush(self, size: int | None = None):
+        arrays = [
+            pa.array(
+                list(map(to_datetime, column[:size]))
+                if pa.types.is_timestamp(field.type)
+                else column[:size],
+                type=field.type,
+            )
+            for column, field in zip(self.columns, self.schema)
+        ]
+        self.writer.write_table(
+            pa.Table.from_arrays(arrays, schema=self.schema),
+            row_group_size=self.row_group_size,
+        )
+        self.columns = [column[size:] if size else [] for column in self.columns]
+
+    def close(self):
+        if self.columns[0]:
+            self.flush()
+        self.writer.close()
+
+
+def read_parquet(path: Path) -> tuple[TableSchema, Iterator[tuple[Any, ...]]]:
+    """
+    Returns: the schema and the rows of a table, read one row group at a time
+    """
+    file = pq.ParquetFile(path)
+    schema = file.schema_arrow
+    python_types = {arrow_type: t for t, arrow_type in ARROW_TYPES.items()}
+
+    def rows() -> Iterator[tuple[Any, ...]]:
+        for group in range(file.num_row_groups):
+            yield from zip(*file.read_row_group(group).to_pydict().values())
+
+    column_types = {field.name: python_types[field.type] for field in schema}
+    return TableSchema(schema.names, column_types), rows()
@@ -1,10 +1,12 @@
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from typing import Iterator
 
+from pydantic import TypeAdapter
 from requests import Session
 
-from paddle.downloader.models import Playlist, PlaylistTrack
-from paddle.downloader.session import get_response_dict
+from paddle.downloader.models import Page, Playlist, PlaylistTrack
+from paddle.downloader.pagination import get_pages
 
 
 @dataclass
@@ -16,16 +18,23 @@ class PlaylistClient:
 
     session: Session
     playlist: Playlist
-    next_url: str
-    pending_tracks: list[any]
+    # first page of tracks, as embedded in the playlist details
+    tracks_page: Page[PlaylistTrack]
+    # validates the following tracks pages
+    tracks_page_adapter: TypeAdapter
+    page_executor: Executor | None = None
+    page_window: int = 1
+    # `fields` projection of the following tracks pages
+    tracks_fields: str | None = None
 
     def get_tracks(self) -> Iterator[PlaylistTrack]:
-        for item in self.pending_tracks:
-            yield PlaylistTrack.model_validate(item)
-        next_url = self.next_url
-        while next_url is not None:
-            res = self.session.get(next_url)
-            data = get_response_dict(res)
-            for item in data["items"]:
-                yield PlaylistTrack.model_validate(item)
-            next_url = data["next"]
+        pages = get_pages(
+            self.session,
+            self.tracks_page,
+            self.tracks_page_adapter,
+            executor=self.page_executor,
+            window=self.page_window,
+            params={"fields": self.tracks_fields} if self.tracks_fields else None,
+        )
+        for page in pages:
+            yield from page.items
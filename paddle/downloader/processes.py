@@ -0,0 +1,206 @@
+"""
+Multi-process download mode for CPU-bound runs (validation, CSV and gzip writing).
+A coordinator queues the listed playlists in a WorkQueue, then worker processes download them
+into their own tables, which are finally merged and deduplicated into the standard tables.
+"""
+import logging
+import multiprocessing
+import shutil
+import time
+from dataclasses import replace
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from operator import itemgetter
+from pathlib import Path
+from typing import Iterator
+
+from paddle.downloader.config import Config
+from paddle.downloader.enrichment import Enrichment
+from paddle.downloader.main import (
+    create_record_builder,
+    create_snapshot_store,
+    enrich,
+    open_client,
+    process_playlists,
+)
+from paddle.downloader.models import SimplifiedPlaylist
+from paddle.downloader.records import (
+    RecordWriter,
+    TABLE_BUILDERS,
+    close_id_set,
+    create_id_set,
+    read_table,
+    table_names,
+)
+from paddle.downloader.work_queue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+# directory of the queue and the worker outputs within the output directory
+WORK_DIR = ".work"
+# seconds an idle worker waits for more playlists to be queued
+POLL_INTERVAL = 0.1
+# maximum number of replaced dead workers per process
+MAX_RESTARTS = 3
+
+
+def download(config: Config):
+    work_dir = config.output_dir / WORK_DIR
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir()
+    queue_path = work_dir / "queue.sqlite"
+    queue = WorkQueue(queue_path)
+    # the playlists are listed before the workers start, as they share the whole rate limit
+    with open_client(config) as client:
+        for category_id in config.category_ids:
+            logger.info(f"Starting to process category: '{category_id}'")
+            for item in client.get_playlists(category_id):
+                if queue.put(item):
+                    logger.info(f"Queued playlist ID: {item.id}")
+                else:
+                    logger.info(f"Ignoring duplicate playlist ID: {item.id}")
+    queue.finish()
+    workers = {n: start_worker(config, n, queue_path) for n in range(config.processes)}
+    finished = supervise(config, queue, queue_path, workers)
+    queue.close()
+    merge_tables(config, [worker_config(config, n) for n in finished])
+    shutil.rmtree(work_dir)
+
+
+def start_worker(config: Config, worker: int, queue_path: Path) -> BaseProcess:
+    process = multiprocessing.Process(
+        target=work, args=(config, worker, queue_path), name=f"worker-{worker}"
+    )
+    process.start()
+    return process
+
+
+def supervise(
+    config: Config,
+    queue: WorkQueue,
+    queue_path: Path,
+    workers: dict[int, BaseProcess],
+) -> list[int]:
+    """
+    Waits for all workers, replacing dead workers and requeueing all of their playlists,
+    as their partially written tables are discarded.
+
+    Returns: the workers which finished successfully
+    """
+    finished = []
+    restarts = 0
+    next_worker = len(workers)
+    while workers:
+        wait([process.sentinel for process in workers.values()])
+        for n, process in list(workers.items()):
+            if process.exitcode is None:
+                continue
+            del workers[n]
+            if process.exitcode == 0:
+                finished.append(n)
+                continue
+            requeued = queue.requeue(n)
+            logger.warning(
+                f"Worker {n} died with exit code {process.exitcode}, "
+                f"requeued {requeued} playlists"
+            )
+            restarts += 1
+            if restarts > MAX_RESTARTS * config.processes:
+                raise RuntimeError(f"Too many dead workers ({restarts})")
+            workers[next_worker] = start_worker(config, next_worker, queue_path)
+            next_worker += 1
+    return sorted(finished)
+
+
+def worker_config(config: Config, worker: int) -> Config:
+    """
+    Returns: the config of a worker, writing its own tables and sharing the rate limit
+    """
+    spotify = replace(
+        config.spotify,
+        rate_limit_requests_per_bucket=max(
+            1, config.spotify.rate_limit_requests_per_bucket // config.processes
+        ),
+    )
+    return replace(
+        config,
+        spotify=spotify,
+        output_dir=config.output_dir / WORK_DIR / f"worker-{worker}",
+    )
+
+
+def work(config: Config, worker: int, queue_path: Path):
+    config = worker_config(config, worker)
+    config.output_dir.mkdir()
+    builder = create_record_builder(config)
+    store = create_snapshot_store(config)
+    queue = WorkQueue(queue_path)
+    enrichment = Enrichment.from_config(config)
+    with open_client(config, builder) as client:
+        process_playlists(
+            client,
+            builder,
+            claims(queue, worker),
+            workers=config.workers,
+            store=store,
+            enrichment=enrichment,
+        )
+        if enrichment is not None:
+            enrich(client, builder, enrichment)
+    builder.close()
+    if store is not None:
+        store.close()
+    queue.close()
+
+
+def claims(queue: WorkQueue, worker: int) -> Iterator[SimplifiedPlaylist]:
+    """
+    Yields the playlists claimed by the worker until the queue is finished.
+    """
+    while True:
+        item = queue.claim(worker)
+        if item is not None:
+            yield item
+        elif queue.is_finished():
+            return
+        else:
+            time.sleep(POLL_INTERVAL)
+
+
+def merge_tables(config: Config, worker_configs: list[Config]):
+    """
+    Merges the tables of the workers into the output directory, keeping the first row
+    of each primary key, as a sequential run would.
+    """
+    names = sorted({name for worker in worker_configs for name in table_names(worker)})
+    for table_name in names:
+        writer = None
+        ids = create_id_set(config, table_name)
+        merged = 0
+        for worker in worker_configs:
+            schema, reader = read_table(worker, table_name)
+            if writer is None:
+                # the CSV tables do not store their primary key
+                primary_key = (
+                    schema.primary_key or TABLE_BUILDERS[table_name].primary_key
+                )
+                writer = RecordWriter(
+                    config,
+                    table_name,
+                    schema.column_names,
+                    schema.column_types,
+                    primary_key,
+                )
+                key_of = itemgetter(
+                    *(schema.column_names.index(name) for name in primary_key)
+                )
+            for row in reader:
+                key = key_of(row)
+                if key in ids:
+                    continue
+                ids.add(key)
+                writer.writerow(row)
+                merged += 1
+        writer.close()
+        close_id_set(ids)
+        logger.info(f"Merged {merged} rows into {table_name}")
@@ -0,0 +1,118 @@
+"""
+Builds the `fields` query parameter of the playlist endpoints, so the API only returns the fields
+required by the models and read by the builders.
+See https://developer.spotify.com/documentation/web-api/reference/get-playlist
+"""
+import types
+import typing
+from dataclasses import dataclass
+from typing import Iterable, Annotated
+
+from pydantic import BaseModel
+
+from paddle.downloader.models import Playlist, PlaylistTrack
+
+# A tree of field names; an empty tree selects the whole field
+FieldTree = dict[str, "FieldTree"]
+
+PAGING_FIELDS = ("limit", "next", "offset", "total")
+
+
+def merge(*trees: FieldTree) -> FieldTree:
+    """
+    Merges field trees. Selecting a whole field takes precedence over selecting some of its fields.
+    """
+    result: FieldTree = {}
+    for tree in trees:
+        for name, subtree in tree.items():
+            if name not in result:
+                result[name] = subtree
+            elif result[name] and subtree:
+                result[name] = merge(result[name], subtree)
+            else:
+                result[name] = {}
+    return result
+
+
+def nested_models(annotation: typing.Any) -> list[type[BaseModel]]:
+    """
+    Returns: the models of an annotation, looking into lists, optionals, unions and annotations
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return [annotation]
+    origin = typing.get_origin(annotation)
+    if origin in (list, typing.Union, types.UnionType):
+        return [m for arg in typing.get_args(annotation) for m in nested_models(arg)]
+    if origin is Annotated:
+        return nested_models(typing.get_args(annotation)[0])
+    return []
+
+
+def required_fields(model: type[BaseModel]) -> FieldTree:
+    """
+    Returns: the fields required to validate the model
+    """
+    tree: FieldTree = {}
+    for name, field in model.model_fields.items():
+        if not field.is_required():
+            continue
+        models = nested_models(field.annotation)
+        tree[name] = merge(*(required_fields(m) for m in models)) if models else {}
+    return tree
+
+
+def paths_tree(paths: Iterable[str]) -> FieldTree:
+    """
+    Returns: the field tree of dotted paths, e.g. "track.album.id"
+    """
+    tree: FieldTree = {}
+    for path in paths:
+        subtree: FieldTree = {}
+        for name in reversed(path.split(".")):
+            subtree = {name: subtree}
+        tree = merge(tree, subtree)
+    return tree
+
+
+def format_fields(tree: FieldTree) -> str:
+    """
+    Formats a field tree in the syntax of the `fields` parameter, e.g. "id,owner(id,uri)"
+    """
+    return ",".join(
+        f"{name}({format_fields(subtree)})" if subtree else name
+        for name, subtree in sorted(tree.items())
+    )
+
+
+@dataclass
+class Projection:
+    """
+    The `fields` parameters of the playlist details and of the playlist tracks pages.
+    """
+
+    playlist: str
+    tracks: str
+
+    @staticmethod
+    def create(
+        playlist_paths: Iterable[str],
+        track_paths: Iterable[str],
+        track_model: type[BaseModel] = PlaylistTrack,
+    ) -> "Projection":
+        """
+        Args:
+            playlist_paths: the dotted paths read from the Playlist
+            track_paths: the dotted paths read from each PlaylistTrack
+            track_model: the model the tracks are validated with
+        """
+        track_tree = merge(required_fields(track_model), paths_tree(track_paths))
+        tracks_page_tree = merge(paths_tree(PAGING_FIELDS), {"items": track_tree})
+        playlist_tree = merge(
+            required_fields(Playlist),
+            paths_tree(playlist_paths),
+            {"tracks": tracks_page_tree},
+        )
+        return Projection(
+            playlist=format_fields(playlist_tree),
+            tracks=format_fields(tracks_page_tree),
+        )
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveRate:
+    """
+    Request rate adapted with additive increase and multiplicative decrease (AIMD).
+    Every successful response increases the rate by about `increase` requests/s per second,
+    every rate-limit error cuts it by the `decrease` factor and blocks all requests for Retry-After.
+    The limiter does no I/O itself, the sessions wait until their reserved send time.
+    """
+
+    # current rate in requests/s
+    rate: float
+    min_rate: float
+    increase: float
+    decrease: float
+    # number of times the rate was cut
+    cuts: int
+    # earliest send time of the next request
+    next_time: float
+    last_cut: float
+    lock: threading.Lock
+
+    def __init__(
+        self, rate: float, min_rate: float, increase: float, decrease: float = 0.5
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cuts = 0
+        self.next_time = 0.0
+        self.last_cut = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Returns: the (monotonic) time at which the caller may send its request
+        """
+        with self.lock:
+            send_time = max(time.monotonic(), self.next_time)
+            self.next_time = send_time + 1 / self.rate
+        return send_time
+
+    def on_success(self):
+        with self.lock:
+            # as there are `rate` responses per second, this adds `increase` per second
+            self.rate += self.increase / self.rate
+
+    def on_rate_limited(self, sent_at: float, retry_after: float):
+        """
+        Args:
+            sent_at: the send time of the rate-limited request
+            retry_after: seconds to wait before sending any further request
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.next_time = max(self.next_time, now + retry_after)
+            # requests sent before the last cut are already answered for
+            if sent_at < self.last_cut:
+                return
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.last_cut = now
+            self.cuts += 1
+        logger.warning(f"Rate-limit cut the request rate to {self.rate:.2f}/s")
+
+    def __str__(self):
+        return f"{self.rate:.2f} requests/s after {self.cuts} cuts"
+
+
+class HostCooldown:
+    """
+    Retry-After deadlines per host. Every request to a host is parked until its deadline,
+    not only the rate-limited one, while requests to other hosts and the processing continue.
+    """
+
+    # monotonic time until which each host is cooling down
+    deadlines: dict[str, float]
+    lock: threading.Lock
+
+    def __init__(self):
+        self.deadlines = {}
+        self.lock = threading.Lock()
+
+    def start(self, host: str, retry_after: float):
+        with self.lock:
+            deadline = time.monotonic() + retry_after
+            self.deadlines[host] = max(self.deadlines.get(host, 0.0), deadline)
+
+    def remaining(self, host: str) -> float:
+        """
+        Returns: the seconds requests to the host are still parked for
+        """
+        with self.lock:
+            deadline = self.deadlines.get(host, 0.0)
+        return max(0.0, deadline - time.monotonic())
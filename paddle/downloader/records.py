@@ -1,38 +1,375 @@
 import _csv
 import csv
-import gzip
 from abc import ABCMeta, abstractmethod
-from typing import List, Iterable, TextIO, Any
-
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from operator import attrgetter
+from typing import List, Iterable, TextIO, Any, Iterator, TYPE_CHECKING
+
+from paddle.downloader.compression import (
+    ParallelBlockWriter,
+    get_compress,
+    open_compressed,
+)
 from paddle.downloader.config import Config, FileType
-from paddle.downloader.models import SimplifiedTrack, Playlist, PlaylistTrack
+from paddle.downloader.dedup import IdSet, Key
+from paddle.downloader.models import (
+    Playlist,
+    Artist,
+    Album,
+)
+from paddle.downloader.rows import TrackRow, PlaylistCounts
+
+if TYPE_CHECKING:
+    from paddle.downloader.database import DatabaseWriter
+    from paddle.downloader.parquet import ParquetWriter
+
+
+# the database file of all tables with the database file types
+DATABASE_NAME = "records"
+# directory of the spilled keys of the builders within the output directory
+DEDUP_DIR = ".dedup"
+# directory of the persistent indexes of the emitted keys when appending
+INDEX_DIR = ".index"
+# the columns of the partitions of the partitioned tables, in the order of their directories
+PARTITION_COLUMNS = ("category", "fetched_date")
+# number of extracted rows buffered by each track table between writes,
+# and of rows written by each table between the commits of the persistent index
+WRITE_BATCH_SIZE = 1024
+
+
+@dataclass
+class TableSchema:
+    column_names: list[str]
+    # the types of the columns typed by the file type, other columns are strings
+    column_types: dict[str, type] = field(default_factory=dict)
+    # only kept by the databases
+    primary_key: tuple[str, ...] = ()
+
+
+def table_path(config: Config, table_name: str) -> Path:
+    """
+    Returns: the file of the table, shared by all tables with the database file types
+    """
+    if config.file_type.is_database:
+        return config.output_dir / f"{DATABASE_NAME}.{config.file_type.value}"
+    return config.output_dir / f"{table_name}.{config.file_type.value}"
+
+
+def table_names(config: Config) -> list[str]:
+    """
+    Returns: the names of the tables written into the output directory
+    """
+    if config.file_type.is_database:
+        from paddle.downloader.database import database_table_names
+
+        path = table_path(config, DATABASE_NAME)
+        return database_table_names(path, config.file_type) if path.exists() else []
+    if config.partitioned:
+        return [
+            path.name
+            for path in config.output_dir.iterdir()
+            if path.is_dir() and any(path.glob(f"{PARTITION_COLUMNS[0]}=*"))
+        ]
+    suffix = f".{config.file_type.value}"
+    return [
+        path.name.removesuffix(suffix) for path in config.output_dir.glob(f"*{suffix}")
+    ]
+
+
+def partition_dir(
+    config: Config, table_name: str, category: str, fetched_date: str
+) -> Path:
+    """
+    Returns: the Hive-style directory of a partition of the table
+    """
+    path = config.output_dir / table_name
+    for column, value in zip(PARTITION_COLUMNS, (category, fetched_date)):
+        path /= f"{column}={value}"
+    return path
+
+
+def partition_files(
+    config: Config, table_name: str
+) -> list[tuple[Path, tuple[str, ...]]]:
+    """
+    Returns: the part files of all partitions of the table, with the values of their partitions
+    """
+    pattern = "/".join(f"{column}=*" for column in PARTITION_COLUMNS)
+    files = []
+    for path in (config.output_dir / table_name).glob(
+        f"{pattern}/part-*.{config.file_type.value}"
+    ):
+        values = tuple(
+            parent.name.partition("=")[2]
+            for parent in reversed(path.parents[: len(PARTITION_COLUMNS)])
+        )
+        part = int(path.name.removeprefix("part-").partition(".")[0])
+        files.append((values, part, path))
+    return [(path, values) for values, _, path in sorted(files)]
+
+
+def open_table(config: Config, table_name: str, mode: str = "rt") -> TextIO:
+    return open_file(config, table_path(config, table_name), mode)
+
+
+def open_file(config: Config, path: Path, mode: str = "rt") -> TextIO:
+    match config.file_type:
+        case FileType.csv:
+            return open(path, mode)
+        case FileType.csvgz | FileType.csvzst | FileType.csvlz4 if mode[0] in "wa":
+            return ParallelBlockWriter(
+                path,
+                get_compress(config.file_type, config.compression_level),
+                workers=config.compression_workers,
+                append=mode.startswith("a"),
+            )
+        case FileType.csvgz | FileType.csvzst | FileType.csvlz4:
+            return open_compressed(path, config.file_type)
+
+
+def read_table(
+    config: Config, table_name: str
+) -> tuple[TableSchema, Iterator[tuple[Any, ...]]]:
+    """
+    Returns: the schema and the rows of a written table, followed by the values of their
+        partition columns if the table is partitioned
+    """
+    if config.partitioned:
+        return read_partitions(config, table_name)
+    return read_file(config, table_path(config, table_name), table_name)
+
+
+def read_file(
+    config: Config, path: Path, table_name: str
+) -> tuple[TableSchema, Iterator[tuple[Any, ...]]]:
+    if config.file_type == FileType.parquet:
+        # pyarrow is an optional dependency only required by this file type
+        from paddle.downloader.parquet import read_parquet
+
+        return read_parquet(path)
+    if config.file_type.is_database:
+        from paddle.downloader.database import read_database_table
+
+        return read_database_table(path, config.file_type, table_name)
+
+    def rows() -> Iterator[tuple[Any, ...]]:
+        with open_file(config, path) as f:
+            reader = csv.reader(f)
+            next(reader)
+            yield from map(tuple, reader)
+
+    with open_file(config, path) as f:
+        column_names = next(csv.reader(f))
+    return TableSchema(column_names), rows()
+
+
+def read_partitions(
+    config: Config, table_name: str
+) -> tuple[TableSchema, Iterator[tuple[Any, ...]]]:
+    files = partition_files(config, table_name)
+    schema, _ = read_file(config, files[0][0], table_name)
+    schema.column_names = [*schema.column_names, *PARTITION_COLUMNS]
+
+    def rows() -> Iterator[tuple[Any, ...]]:
+        for path, values in files:
+            _, file_rows = read_file(config, path, table_name)
+            for row in file_rows:
+                yield *row, *values
+
+    return schema, rows()
 
 
 class RecordWriter:
-    w: "_csv._writer"
-    f: TextIO
-
-    def __init__(self, config: Config, table_name: str, column_names: Iterable[str]):
-        match config.file_type:
-            case FileType.csv:
-                self.f = open(config.output_dir / f"{table_name}.csv", "wt")
-            case FileType.csvgz:
-                self.f = gzip.open(config.output_dir / f"{table_name}.csv.gz", "wt")
+    """
+    Writes the rows of a table, typed by `column_types` (strings by default) where the file type
+    supports it, i.e. with Parquet and the databases. The databases upsert the rows
+    by their `primary_key`. With `append`, the rows are appended to the existing CSV tables.
+
+    Partitioned tables are written as a new part file of the partition of the current category
+    and fetch date, opened by the first row written after `start_partition`.
+    """
+
+    config: Config
+    table_name: str
+    column_names: tuple[str, ...]
+    column_types: dict[str, type]
+    primary_key: tuple[str, ...]
+    w: "_csv._writer | ParquetWriter | DatabaseWriter | None" = None
+    f: TextIO | None = None
+    # the partition of the written rows, when partitioned
+    category: str | None = None
+    fetched_date: str
+
+    def __init__(
+        self,
+        config: Config,
+        table_name: str,
+        column_names: Iterable[str],
+        column_types: dict[str, type] | None = None,
+        primary_key: Iterable[str] = (),
+    ):
+        self.config = config
+        self.table_name = table_name
+        self.column_names = tuple(column_names)
+        self.column_types = column_types or {}
+        self.primary_key = tuple(primary_key)
+        if not config.partitioned:
+            self.__open(table_path(config, table_name), config.append)
+            return
+        if config.file_type.is_database:
+            raise ValueError(f"{config.file_type} tables cannot be partitioned")
+        self.fetched_date = datetime.now(timezone.utc).date().isoformat()
+
+    def __open(self, path: Path, append: bool):
+        config = self.config
+        if config.file_type == FileType.parquet:
+            if append:
+                raise ValueError("Parquet tables cannot be appended to")
+            from paddle.downloader.parquet import ParquetWriter
+
+            self.w = ParquetWriter(
+                path, self.column_names, self.column_types, config.row_group_size
+            )
+            return
+        if config.file_type.is_database:
+            from paddle.downloader.database import DatabaseWriter
+
+            self.w = DatabaseWriter(
+                path,
+                config.file_type,
+                self.table_name,
+                self.column_names,
+                self.column_types,
+                self.primary_key,
+                config.row_group_size,
+            )
+            return
+        is_new = not path.exists() or path.stat().st_size == 0
+        self.f = open_file(config, path, "at" if append else "wt")
         self.w = csv.writer(self.f)
-        self.w.writerow(column_names)
+        if is_new or not append:
+            self.w.writerow(self.column_names)
+
+    def __open_partition(self):
+        assert self.category is not None, "No partition was started"
+        directory = partition_dir(
+            self.config, self.table_name, self.category, self.fetched_date
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        # the part files of previous runs are kept
+        part = sum(1 for _ in directory.glob("part-*"))
+        self.__open(directory / f"part-{part}.{self.config.file_type.value}", False)
+
+    def start_partition(self, category: str):
+        """
+        Writes the following rows into the partition of the category, if partitioned.
+        """
+        if not self.config.partitioned:
+            return
+        self.close()
+        self.category = category
 
     def writerow(self, row: Iterable[Any]):
+        if self.w is None:
+            self.__open_partition()
         self.w.writerow(row)
 
+    def writerows(self, rows: Iterable[Iterable[Any]]):
+        if self.w is None:
+            self.__open_partition()
+        self.w.writerows(rows)
+
+    def flush(self):
+        """
+        Writes out the buffered rows.
+        """
+        if self.f is not None:
+            self.f.flush()
+        elif self.w is not None:
+            self.w.flush()
+
     def close(self):
-        self.f.close()
+        if self.w is None:
+            return
+        if self.f is None:
+            self.w.close()
+        else:
+            self.f.close()
+        self.w = None
+        self.f = None
+
+
+def create_id_set(
+    config: Config, table_name: str, category: str | None = None
+) -> "set[Key] | IdSet":
+    """
+    Returns: the set of the keys of the table, a plain set unless it spills to disk
+        with `dedup_max_keys`. When appending, the set is persisted with the keys
+        of all previous runs, whose index is otherwise deleted as the table is rewritten.
+
+    Args:
+        category: the category of the partition of the keys, if partitioned
+    """
+    if config.partitioned and category is None:
+        # no rows are written before the partition of the first category is started
+        return set()
+    index_path = config.output_dir / INDEX_DIR / f"{table_name}.sqlite"
+    if category is not None:
+        index_path = index_path.with_suffix("") / f"category={category}.sqlite"
+    if not config.append:
+        index_path.unlink(missing_ok=True)
+    else:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        return IdSet(config.dedup_max_keys, index_path, persistent=True)
+    if config.dedup_max_keys is None:
+        return set()
+    spill_dir = config.output_dir / DEDUP_DIR
+    spill_dir.mkdir(exist_ok=True)
+    return IdSet(config.dedup_max_keys, spill_dir / f"{table_name}.sqlite")
+
+
+def close_id_set(ids: "set[Key] | IdSet"):
+    if isinstance(ids, IdSet):
+        ids.close()
 
 
 class Builder(metaclass=ABCMeta):
-    def add_playlist(self, playlist: Playlist, tracks: List[PlaylistTrack]):
+    """
+    The rows of each playlist are streamed to `add_track`, followed by `end_playlist`
+    with the counters of the playlist, so no builder requires all rows of a playlist at once.
+    """
+
+    # dotted paths of the fields read from the Playlist and from each PlaylistTrack
+    # (through its TrackRow), requested with the `fields` projection
+    playlist_paths: tuple[str, ...] = ()
+    track_paths: tuple[str, ...] = ()
+
+    def add_playlist(self, playlist: Playlist, rows: List[TrackRow]):
+        """
+        Legacy hook receiving all rows of a playlist once complete,
+        builders overriding it are wrapped in a PlaylistRowsAdapter by the RecordBuilder.
+        """
         pass
 
-    def add_track(self, playlist: Playlist, playlist_track: PlaylistTrack):
+    def add_track(self, playlist: Playlist, row: TrackRow):
+        pass
+
+    def end_playlist(self, playlist: Playlist, counts: PlaylistCounts):
+        pass
+
+    def add_artists(self, artists: List[Artist]):
+        pass
+
+    def add_albums(self, albums: List[Album]):
+        pass
+
+    def start_category(self, category_id: str):
+        """
+        Called before the playlists of each category, whose rows are written
+        into its partition by the partitioned builders.
+        """
         pass
 
     @abstractmethod
@@ -40,20 +377,281 @@ class Builder(metaclass=ABCMeta):
         raise NotImplementedError
 
 
+class PlaylistRowsAdapter(Builder):
+    """
+    Collects the rows of each playlist for a builder implementing the legacy `add_playlist`.
+    """
+
+    builder: Builder
+    rows: List[TrackRow]
+
+    def __init__(self, builder: Builder):
+        self.builder = builder
+        self.playlist_paths = builder.playlist_paths
+        self.track_paths = builder.track_paths
+        self.rows = []
+
+    def add_track(self, playlist: Playlist, row: TrackRow):
+        self.rows.append(row)
+        self.builder.add_track(playlist, row)
+
+    def end_playlist(self, playlist: Playlist, counts: PlaylistCounts):
+        rows = self.rows
+        self.rows = []
+        self.builder.add_playlist(playlist, rows)
+        self.builder.end_playlist(playlist, counts)
+
+    def add_artists(self, artists: List[Artist]):
+        self.builder.add_artists(artists)
+
+    def add_albums(self, albums: List[Album]):
+        self.builder.add_albums(albums)
+
+    def start_category(self, category_id: str):
+        self.builder.start_category(category_id)
+
+    def close(self):
+        self.builder.close()
+
+
 class FileBuilder(Builder):
-    w: "_csv._writer"
+    table_name: str
+    primary_key: tuple[str, ...]
+    w: RecordWriter
+    # the keys of the emitted rows
+    ids: "set[Key] | IdSet"
+    # number of rows written since their keys were committed to the persistent index
+    uncommitted: int = 0
+
+    @property
+    def persistent(self) -> bool:
+        return isinstance(self.ids, IdSet) and self.ids.persistent
+
+    def writerow(self, row: Iterable[Any]):
+        self.w.writerow(row)
+        if self.persistent:
+            self.__written(1)
+
+    def writerows(self, rows: list[Iterable[Any]]):
+        self.w.writerows(rows)
+        if self.persistent:
+            self.__written(len(rows))
+
+    def __written(self, num_rows: int):
+        self.uncommitted += num_rows
+        if self.uncommitted >= WRITE_BATCH_SIZE:
+            self.commit()
+
+    def commit(self):
+        """
+        Writes out the written rows, then commits their keys to the persistent index.
+        A failed run thus writes at most its last batch of rows again with the next run,
+        and never loses rows whose keys were committed.
+        """
+        self.w.flush()
+        self.ids.commit()
+        self.uncommitted = 0
+
+    def start_category(self, category_id: str):
+        self.w.start_partition(category_id)
+        config = self.w.config
+        if config.partitioned:
+            # each partition has all rows of its category, even those of other partitions
+            close_id_set(self.ids)
+            self.ids = create_id_set(config, self.table_name, category_id)
+            self.uncommitted = 0
 
     def close(self):
         self.w.close()
+        close_id_set(self.ids)
+
+
+# the sources of the columns of the track tables: the ID of the playlist, the fields
+# of the track row, and the fields of each artist of the track
+TRACK_SOURCES = ("playlist.id", *TrackRow.__slots__, "artist.id", "artist.name")
+# the dotted paths of the PlaylistTrack fields of the sources
+SOURCE_PATHS = {
+    **dict(zip(TrackRow.__slots__[1:], TrackRow.track_paths)),
+    "artist.id": "track.artists.id",
+    "artist.name": "track.artists.name",
+}
+# the attributes of the sources in TrackSources
+SOURCE_ATTRIBUTES = {
+    "playlist.id": "playlist_id",
+    **{slot: f"row.{slot}" for slot in TrackRow.__slots__},
+    "artist.id": "artist_id",
+    "artist.name": "artist_name",
+}
+
+
+class TrackSources:
+    """
+    The sources of the columns of the track tables for the row being extracted: the playlist ID,
+    the track row and one of its artists, set by the TrackExtractor.
+    """
+
+    __slots__ = ("playlist_id", "row", "artist_id", "artist_name")
+    playlist_id: str
+    row: TrackRow
+    artist_id: str
+    artist_name: str
+
+
+@dataclass
+class TrackTable:
+    """
+    Declarative spec of a table extracted from the track rows, by the sources of its columns.
+    Tables with columns of the artists have a row per artist of each track.
+    """
+
+    table_name: str
+    # the sources (in TRACK_SOURCES) of the columns, by their names
+    columns: dict[str, str]
+    primary_key: tuple[str, ...]
+    column_types: dict[str, type] = field(default_factory=dict)
+
+    @property
+    def per_artist(self) -> bool:
+        return any(source.startswith("artist.") for source in self.columns.values())
+
+    def __post_init__(self):
+        # the getters of the rows only return tuples of several columns
+        assert len(self.columns) > 1, f"{self.table_name} has a single column"
+
+    def getter(self, column_names: tuple[str, ...]) -> attrgetter:
+        """
+        Returns: the getter of the values of the columns from the TrackSources,
+            a plain value for a single column
+        """
+        return attrgetter(
+            *(SOURCE_ATTRIBUTES[self.columns[name]] for name in column_names)
+        )
+
+    @property
+    def track_paths(self) -> tuple[str, ...]:
+        return tuple(
+            SOURCE_PATHS[source]
+            for source in self.columns.values()
+            if source in SOURCE_PATHS
+        )
+
+
+class TrackTableBuilder(FileBuilder):
+    """
+    Builds the table of its `table` spec. The RecordBuilder extracts the rows of all of its
+    track tables with one TrackExtractor, by the getters of their keys and rows.
+    The rows are written in batches of WRITE_BATCH_SIZE.
+    """
+
+    table: TrackTable
+    # whether the rows are extracted from the tracks
+    extracts_tracks: bool = True
+    rows: list[tuple[Any, ...]]
+    # the getters of the key and the row of the table from the TrackSources
+    key_of: attrgetter
+    row_of: attrgetter
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.table_name = cls.table.table_name
+        cls.primary_key = cls.table.primary_key
+        cls.track_paths = cls.table.track_paths
+        cls.key_of = cls.table.getter(cls.primary_key)
+        cls.row_of = cls.table.getter(tuple(cls.table.columns))
+
+    def __init__(self, config: Config):
+        table = self.table
+        self.w = RecordWriter(
+            config=config,
+            table_name=self.table_name,
+            column_names=self.column_names(),
+            column_types=table.column_types,
+            primary_key=self.primary_key,
+        )
+        self.ids = create_id_set(config, self.table_name)
+        self.rows = []
+
+    def column_names(self) -> tuple[str, ...]:
+        return tuple(self.table.columns)
+
+    def flush(self):
+        if self.rows:
+            self.writerows(self.rows)
+            self.rows = []
+
+    def start_category(self, category_id: str):
+        # the buffered rows belong to the previous partition
+        self.flush()
+        super().start_category(category_id)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+# a track table builder with the getters of its key and row
+ExtractedTable = tuple[TrackTableBuilder, attrgetter, attrgetter]
+
+
+class TrackExtractor:
+    """
+    Extracts the rows of several track tables in a single pass over each track row:
+    the type of the row is checked once, and its artists are iterated over once.
+    """
+
+    sources: TrackSources
+    # the tables with a row per track, and with a row per artist
+    tables: list[ExtractedTable]
+    artist_tables: list[ExtractedTable]
+
+    def __init__(self, builders: List[TrackTableBuilder]):
+        self.sources = TrackSources()
+        self.tables = [
+            (b, b.key_of, b.row_of) for b in builders if not b.table.per_artist
+        ]
+        self.artist_tables = [
+            (b, b.key_of, b.row_of) for b in builders if b.table.per_artist
+        ]
+
+    def add_track(self, playlist: Playlist, row: TrackRow):
+        if row.type != "track":
+            return
+        sources = self.sources
+        sources.playlist_id = playlist.id
+        sources.row = row
+        self.extract(self.tables)
+        if self.artist_tables:
+            for sources.artist_id, sources.artist_name in zip(
+                row.artist_ids, row.artist_names
+            ):
+                self.extract(self.artist_tables)
+
+    def extract(self, tables: list[ExtractedTable]):
+        """
+        Adds the row of the sources to each of the tables, unless its key was added.
+        """
+        sources = self.sources
+        for builder, key_of, row_of in tables:
+            key = key_of(sources)
+            ids = builder.ids
+            if key in ids:
+                continue
+            ids.add(key)
+            rows = builder.rows
+            rows.append(row_of(sources))
+            if len(rows) >= WRITE_BATCH_SIZE:
+                builder.flush()
 
 
 class CategoryPlaylistRecords(FileBuilder):
-    ids: set[str]
+    table_name = "category_playlists_records"
+    primary_key = ("id",)
+    playlist_paths = ("description", "name", "id", "uri", "snapshot_id")
 
     def __init__(self, config: Config):
         self.w = RecordWriter(
             config=config,
-            table_name="category_playlists_records",
+            table_name=self.table_name,
             column_names=(
                 "description",
                 "name",
@@ -62,150 +660,252 @@ class CategoryPlaylistRecords(FileBuilder):
                 "total_tracks",
                 "snapshot_id",
             ),
+            column_types={"total_tracks": int},
+            primary_key=self.primary_key,
         )
-        self.ids = set()
+        self.ids = create_id_set(config, self.table_name)
 
-    def add_playlist(self, playlist: Playlist, tracks: List[PlaylistTrack]):
+    def end_playlist(self, playlist: Playlist, counts: PlaylistCounts):
         sid = playlist.id
         if sid in self.ids:
             return
         self.ids.add(sid)
-        self.w.writerow(
+        self.writerow(
             (
                 playlist.description,
                 playlist.name,
                 playlist.id,
                 f"{playlist.uri}/tracks",
-                len(tracks),
+                counts.items,
                 playlist.snapshot_id,
             )
         )
 
 
 class PlaylistRecords(FileBuilder):
-    ids: set[str]
+    table_name = "playlist_records"
+    primary_key = ("id",)
+    playlist_paths = ("id", "followers.total")
 
     def __init__(self, config: Config):
         self.w = RecordWriter(
             config=config,
-            table_name="playlist_records",
+            table_name=self.table_name,
             column_names=("id", "followers"),
+            column_types={"followers": int},
+            primary_key=self.primary_key,
         )
-        self.ids = set()
+        self.ids = create_id_set(config, self.table_name)
 
-    def add_playlist(self, playlist: Playlist, _tracks: List[PlaylistTrack]):
+    def end_playlist(self, playlist: Playlist, _counts: PlaylistCounts):
         sid = playlist.id
         if sid in self.ids:
             return
         self.ids.add(sid)
-        self.w.writerow((playlist.id, playlist.followers.total))
-
-
-class TracksRecords(FileBuilder):
-    ids: set[str]
+        self.writerow((playlist.id, playlist.followers.total))
+
+
+class TracksRecords(TrackTableBuilder):
+    table = TrackTable(
+        table_name="tracks_records",
+        columns={
+            "album_type": "album_type",
+            "id": "id",
+            "name": "name",
+            "popularity": "popularity",
+            "uri": "uri",
+        },
+        column_types={"popularity": int},
+        primary_key=("id",),
+    )
+
+
+class PlaylistTrackIdRecords(TrackTableBuilder):
+    table = TrackTable(
+        table_name="playlist_track_id_records",
+        columns={
+            "playlist_id": "playlist.id",
+            "playlist_added_at": "added_at",
+            "track_id": "id",
+        },
+        column_types={"playlist_added_at": datetime},
+        primary_key=("playlist_id", "track_id"),
+    )
+
+
+class TrackArtistIdRecords(TrackTableBuilder):
+    table = TrackTable(
+        table_name="track_artist_id_records",
+        columns={"track_id": "id", "artist_id": "artist.id"},
+        primary_key=("track_id", "artist_id"),
+    )
+
+
+class ArtistsRecords(TrackTableBuilder):
+    """
+    Artists of the tracks, with their full details if the artists are enriched.
+    """
+
+    table = TrackTable(
+        table_name="artists_records",
+        columns={"id": "artist.id", "name": "artist.name"},
+        column_types={"followers": int, "popularity": int},
+        primary_key=("id",),
+    )
+    enriched: bool
 
     def __init__(self, config: Config):
-        self.w = RecordWriter(
-            config=config,
-            table_name="tracks_records",
-            column_names=("album_type", "id", "name", "popularity", "uri"),
-        )
-        self.ids = set()
-
-    def add_track(self, playlist: Playlist, playlist_track: PlaylistTrack):
-        track = playlist_track.track
-        if isinstance(track, SimplifiedTrack):
-            sid = track.id
-            if sid in self.ids:
-                return
-            self.ids.add(sid)
-            self.w.writerow(
-                (track.album.type, track.id, track.name, track.popularity, track.uri)
+        self.enriched = config.enrich_artists
+        # the enriched artists are only added by `add_artists`
+        self.extracts_tracks = not self.enriched
+        super().__init__(config)
+
+    def column_names(self) -> tuple[str, ...]:
+        column_names = super().column_names()
+        if self.enriched:
+            column_names += ("followers", "genres", "popularity", "image_url")
+        return column_names
+
+    def add_artists(self, artists: List[Artist]):
+        for artist in artists:
+            if artist.id in self.ids:
+                continue
+            self.ids.add(artist.id)
+            self.writerow(
+                (
+                    artist.id,
+                    artist.name,
+                    artist.followers.total,
+                    ";".join(artist.genres),
+                    artist.popularity,
+                    artist.images[0].url if artist.images else None,
+                )
             )
 
 
-class PlaylistTrackIdRecords(FileBuilder):
-    ids: set[(str, str)]
+class AlbumsRecords(FileBuilder):
+    """
+    Full details of the albums of the tracks, only available if the albums are enriched.
+    """
+
+    table_name = "albums_records"
+    primary_key = ("id",)
+    track_paths = ("track.album.id",)
 
     def __init__(self, config: Config):
         self.w = RecordWriter(
             config=config,
-            table_name="playlist_track_id_records",
+            table_name=self.table_name,
             column_names=(
-                "playlist_id",
-                "playlist_added_at",
-                "track_id",
+                "id",
+                "name",
+                "album_type",
+                "label",
+                "genres",
+                "popularity",
+                "release_date",
+                "release_date_precision",
+                "total_tracks",
+                "upc",
+                "copyrights",
             ),
+            column_types={"popularity": int, "total_tracks": int},
+            primary_key=self.primary_key,
         )
-        self.ids = set()
-
-    def add_track(self, playlist: Playlist, playlist_track: PlaylistTrack):
-        track = playlist_track.track
-        if isinstance(track, SimplifiedTrack):
-            sid = (playlist.id, track.id)
-            if sid in self.ids:
-                return
-            self.ids.add(sid)
-            self.w.writerow(
-                (playlist.id, playlist_track.added_at.isoformat(), track.id)
+        self.ids = create_id_set(config, self.table_name)
+
+    def add_albums(self, albums: List[Album]):
+        for album in albums:
+            if album.id in self.ids:
+                continue
+            self.ids.add(album.id)
+            self.writerow(
+                (
+                    album.id,
+                    album.name,
+                    album.album_type.value,
+                    album.label,
+                    ";".join(album.genres or ()),
+                    album.popularity,
+                    album.release_date,
+                    album.release_date_precision.value,
+                    album.total_tracks,
+                    album.external_ids.upc if album.external_ids else None,
+                    ";".join(c["text"] for c in album.copyrights or ()),
+                )
             )
 
 
-class TrackArtistIdRecords(FileBuilder):
-    ids: set[(str, str)]
-
-    def __init__(self, config: Config):
-        self.w = RecordWriter(
-            config=config,
-            table_name="track_artist_id_records",
-            column_names=("track_id", "artist_id"),
-        )
-        self.ids = set()
+# the builders of the tables by their names, in the order they are built
+TABLE_BUILDERS: dict[str, type[FileBuilder]] = {
+    builder.table_name: builder
+    for builder in (
+        CategoryPlaylistRecords,
+        PlaylistRecords,
+        TracksRecords,
+        PlaylistTrackIdRecords,
+        TrackArtistIdRecords,
+        ArtistsRecords,
+        AlbumsRecords,
+    )
+}
 
-    def add_track(self, playlist: Playlist, playlist_track: PlaylistTrack):
-        track = playlist_track.track
-        if isinstance(track, SimplifiedTrack):
-            for artist in track.artists:
-                sid = (track.id, artist.id)
-                if sid in self.ids:
-                    return
-                self.ids.add(sid)
-                self.w.writerow((track.id, artist.id))
 
+class RecordBuilder(Builder):
+    builders: List[Builder]
+    extractor: TrackExtractor
+    track_builders: List[Builder]
+    # whether any builder reads the tracks, otherwise only the playlist details are fetched
+    reads_tracks: bool
 
-class ArtistsRecords(FileBuilder):
-    ids: set[str]
-
-    def __init__(self, config: Config):
-        self.w = RecordWriter(
-            config=config, table_name="artists_records", column_names=("id", "name")
+    def __init__(self, builders: List[Builder]):
+        self.builders = [
+            PlaylistRowsAdapter(b)
+            if type(b).add_playlist is not Builder.add_playlist
+            else b
+            for b in builders
+        ]
+        track_tables = [
+            b
+            for b in builders
+            if isinstance(b, TrackTableBuilder) and b.extracts_tracks
+        ]
+        self.extractor = TrackExtractor(track_tables)
+        # the builders whose rows are not extracted by the extractor
+        self.track_builders = [
+            b
+            for b in self.builders
+            if b not in track_tables and type(b).add_track is not Builder.add_track
+        ]
+        self.reads_tracks = any(
+            b.track_paths or type(b).add_track is not Builder.add_track
+            for b in self.builders
         )
-        self.ids = set()
+        self.playlist_paths = tuple(p for b in builders for p in b.playlist_paths)
+        # every row is extracted with all of its columns, whichever builders read them
+        if any(b.track_paths for b in builders):
+            self.track_paths = TrackRow.track_paths
 
-    def add_track(self, playlist: Playlist, playlist_track: PlaylistTrack):
-        track = playlist_track.track
-        if isinstance(track, SimplifiedTrack):
-            for artist in track.artists:
-                sid = artist.id
-                if sid in self.ids:
-                    return
-                self.ids.add(sid)
-                self.w.writerow((artist.id, artist.name))
+    def add_track(self, playlist: Playlist, row: TrackRow):
+        self.extractor.add_track(playlist, row)
+        for builder in self.track_builders:
+            builder.add_track(playlist, row)
 
+    def end_playlist(self, playlist: Playlist, counts: PlaylistCounts):
+        for builder in self.builders:
+            builder.end_playlist(playlist, counts)
 
-class RecordBuilder(Builder):
-    builders: List[Builder]
-
-    def __init__(self, builders: List[Builder]):
-        self.builders = builders
+    def add_artists(self, artists: List[Artist]):
+        for builder in self.builders:
+            builder.add_artists(artists)
 
-    def add_playlist(self, playlist: Playlist, tracks: List[PlaylistTrack]):
+    def add_albums(self, albums: List[Album]):
         for builder in self.builders:
-            builder.add_playlist(playlist, tracks)
+            builder.add_albums(albums)
 
-    def add_track(self, playlist: Playlist, playlist_track: PlaylistTrack):
+    def start_category(self, category_id: str):
         for builder in self.builders:
-            builder.add_track(playlist, playlist_track)
+            builder.start_category(category_id)
 
     def close(self):
         for builder in self.builders:
@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import Any
+
+from paddle.downloader.models import PlaylistTrack
+
+
+class TrackRow:
+    """
+    The columns of a playlist track read by the builders, extracted once from the validated track.
+    Only the rows are kept per playlist, so the object graph of each track (album, artists,
+    markets, images...) is dropped as soon as its row is extracted.
+    Items which are not tracks (episodes) only have their type set.
+    """
+
+    __slots__ = (
+        "type",
+        "added_at",
+        "id",
+        "name",
+        "popularity",
+        "uri",
+        "album_id",
+        "album_type",
+        "artist_ids",
+        "artist_names",
+    )
+
+    # dotted paths of the PlaylistTrack fields the columns are extracted from
+    track_paths = (
+        "added_at",
+        "track.id",
+        "track.name",
+        "track.popularity",
+        "track.uri",
+        "track.album.id",
+        "track.album.type",
+        "track.artists.id",
+        "track.artists.name",
+    )
+
+    type: str
+    # ISO 8601 time the track was added to the playlist
+    added_at: str | None
+    id: str | None
+    name: str | None
+    popularity: int | None
+    uri: str | None
+    album_id: str | None
+    album_type: str | None
+    artist_ids: tuple[str, ...]
+    artist_names: tuple[str, ...]
+
+    def __init__(
+        self,
+        type: str,
+        added_at: str | None = None,
+        id: str | None = None,
+        name: str | None = None,
+        popularity: int | None = None,
+        uri: str | None = None,
+        album_id: str | None = None,
+        album_type: str | None = None,
+        artist_ids: tuple[str, ...] = (),
+        artist_names: tuple[str, ...] = (),
+    ):
+        self.type = type
+        self.added_at = added_at
+        self.id = id
+        self.name = name
+        self.popularity = popularity
+        self.uri = uri
+        self.album_id = album_id
+        self.album_type = album_type
+        self.artist_ids = artist_ids
+        self.artist_names = artist_names
+
+    @staticmethod
+    def create(playlist_track: PlaylistTrack) -> "TrackRow":
+        track = playlist_track.track
+        if track.type != "track":
+            return TrackRow(type=track.type)
+        added_at = playlist_track.added_at
+        return TrackRow(
+            type=track.type,
+            added_at=added_at.isoformat() if added_at is not None else None,
+            id=track.id,
+            name=track.name,
+            popularity=track.popularity,
+            uri=track.uri,
+            album_id=track.album.id,
+            album_type=track.album.type,
+            artist_ids=tuple(artist.id for artist in track.artists),
+            artist_names=tuple(artist.name for artist in track.artists),
+        )
+
+    def astuple(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @staticmethod
+    def fromtuple(values: tuple[Any, ...] | list[Any]) -> "TrackRow":
+        row = TrackRow(*values)
+        # JSON decodes the tuples as lists
+        row.artist_ids = tuple(row.artist_ids)
+        row.artist_names = tuple(row.artist_names)
+        return row
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TrackRow) and self.astuple() == other.astuple()
+
+    def __repr__(self):
+        return f"TrackRow{self.astuple()}"
+
+
+@dataclass
+class PlaylistCounts:
+    """
+    Counters of the items of a playlist, accumulated while its rows are streamed to the builders.
+    """
+
+    # all items, including episodes
+    items: int = 0
+    # only counted from the rows
+    tracks: int = 0
+
+    @staticmethod
+    def from_total(total: int) -> "PlaylistCounts":
+        """
+        Returns: the counters of a playlist whose rows are not fetched, from the total of its items
+        """
+        return PlaylistCounts(items=total)
+
+    def add(self, row: TrackRow):
+        self.items += 1
+        if row.type == "track":
+            self.tracks += 1
@@ -1,19 +1,56 @@
+import json
 import logging
+import threading
 import time
-from dataclasses import dataclass
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, TypeVar
 from urllib.parse import urlparse
 
 import requests
+from pydantic import TypeAdapter
 from pyrate_limiter import RequestRate, Limiter
 from requests import Session
+from requests.adapters import HTTPAdapter
 from requests_ratelimiter import LimiterAdapter
 from urllib3 import Retry
 
-from paddle.downloader.config import SpotifyConfig
+from paddle.downloader.cache import ResponseCache, CacheEntry
+from paddle.downloader.config import SpotifyConfig, JsonDecoder
+from paddle.downloader.rate import AdaptiveRate, HostCooldown
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+class RateLimitError(requests.HTTPError):
+    """
+    Raised once a request is still rate-limited after `rate_limit_max_wait_seconds`.
+    """
+
+
+# compressed responses are already requested by requests and httpx, this makes it explicit
+ACCEPT_ENCODING = "gzip, deflate"
+
+
+@dataclass
+class TransferStats:
+    """
+    Requests sent and response bytes received on the wire (before decompression) per run.
+    """
+
+    requests: int = 0
+    bytes_received: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, num_bytes: int):
+        with self.lock:
+            self.requests += 1
+            self.bytes_received += num_bytes
+
+    def __str__(self):
+        return f"{self.requests} requests, {self.bytes_received / 1024**2:.2f} MiB received"
+
 
 @dataclass
 class SpotifySessionCreator:
@@ -25,6 +62,11 @@ class SpotifySessionCreator:
 
     def create_session(self) -> Session:
         session = SessionWithBase(config=self.config)
+        session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        if self.config.cache_dir is not None:
+            session.cache = ResponseCache(
+                self.config.cache_dir, max_bytes=self.config.cache_max_bytes
+            )
         session.headers.update(self.__get_bearer_token_headers())
         thirty_seconds_rate = RequestRate(
             limit=self.config.rate_limit_requests_per_bucket,
@@ -36,7 +78,12 @@ class SpotifySessionCreator:
             backoff_factor=self.config.retry_backoff,
             status_forcelist=[500, 502, 503, 504],
         )
-        adapter = LimiterAdapter(limiter=limiter, max_retries=retries)
+        if self.config.adaptive_rate_limit:
+            # the session waits for the adaptive rate itself
+            session.rate = create_adaptive_rate(self.config)
+            adapter = HTTPAdapter(max_retries=retries)
+        else:
+            adapter = LimiterAdapter(limiter=limiter, max_retries=retries)
         session.mount("https://", adapter)
         return session
 
@@ -63,34 +110,161 @@ class SpotifySessionCreator:
 class SessionWithBase(Session):
     """
     Extension of the requests Session with support for a base URL.
-    Additionally, it handles rate-limit errors softly by sleeping for Retry-After seconds.
+    Additionally, it handles rate-limit errors softly: all requests to the rate-limited host
+    are parked for Retry-After seconds, while other threads keep processing.
+    A parked request blocks its own thread, so the callers fetch on other threads than
+    the one processing the responses (see `main.download_ahead`).
+    If an adaptive rate is set, requests are paced by it.
+    If a cache is set, GET responses with an ETag are cached and revalidated with If-None-Match.
     """
 
     config: SpotifyConfig
+    cache: ResponseCache | None = None
+    rate: AdaptiveRate | None = None
+    cooldown: HostCooldown
+    transfer: TransferStats
+    json_loads: Callable[[bytes], Any]
 
     def __init__(self, config: SpotifyConfig, *args, **kwargs):
         super(SessionWithBase, self).__init__(*args, **kwargs)
         self.config = config
+        self.json_loads = get_json_loads(config.json_decoder)
+        self.cooldown = HostCooldown()
+        self.transfer = TransferStats()
 
     def request(self, method: str, url: str, **kwargs) -> requests.Response:
-        max_retries = self.config.rate_limit_max_retries
-        for retry in range(max_retries):
-            url = url if urlparse(url).scheme else self.config.base_url + url
+        max_wait = self.config.rate_limit_max_wait_seconds
+        give_up_at = time.monotonic() + max_wait
+        url = url if urlparse(url).scheme else self.config.base_url + url
+        host = urlparse(url).netloc
+        headers = kwargs.get("headers")
+        cached = self.cache.get(url) if self.cache and method == "GET" else None
+        if cached is not None:
+            kwargs["headers"] = {**(headers or {}), "If-None-Match": cached.etag}
+        while True:
+            parked = self.cooldown.remaining(host)
+            if parked > 0:
+                time.sleep(parked)
+            sent_at = self.__wait_for_rate()
             response = super(SessionWithBase, self).request(method, url, **kwargs)
+            self.transfer.add(wire_size(response))
             if response.status_code != 429:
-                return response
+                if self.rate is not None:
+                    self.rate.on_success()
+                cached_response = self.__cache_response(url, response, cached)
+                if cached_response is not None:
+                    return cached_response
+                # the cached body was evicted since, so the request is sent again without it
+                cached = None
+                kwargs["headers"] = headers
+                continue
             retry_after = int(
                 response.headers.get(
                     "Retry-After", self.config.rate_limit_bucket_size_seconds
                 )
             )
             logger.warning(f"Rate-limit encountered with Retry-After: {retry_after}")
-            time.sleep(retry_after)
-        raise AssertionError(f"Still received rate-limit after {max_retries}")
+            self.cooldown.start(host, retry_after)
+            if self.rate is not None:
+                self.rate.on_rate_limited(sent_at, retry_after)
+            if time.monotonic() + retry_after > give_up_at:
+                raise RateLimitError(f"Still rate-limited by {host} after {max_wait}s")
+
+    def __wait_for_rate(self) -> float:
+        """
+        Returns: the time the request is sent at, after waiting for the adaptive rate
+        """
+        if self.rate is None:
+            return time.monotonic()
+        sent_at = self.rate.reserve()
+        delay = sent_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return sent_at
+
+    def __cache_response(
+        self, url: str, response: requests.Response, cached: CacheEntry | None
+    ) -> requests.Response | None:
+        """
+        Returns: the response, with the cached body if not modified,
+            None if the cached body is missing
+        """
+        if cached is not None and response.status_code == 304:
+            content = self.cache.load(cached)
+            if content is None:
+                return None
+            response.status_code = 200
+            response._content = content
+        elif self.cache and response.request.method == "GET" and response.ok:
+            etag = response.headers.get("ETag")
+            if etag is not None:
+                self.cache.put(url, etag, response.content)
+        return response
+
+    def close(self):
+        logger.info(f"HTTP transfer: {self.transfer}")
+        if self.cache is not None:
+            logger.info(f"HTTP cache: {self.cache.stats}")
+        if self.rate is not None:
+            logger.info(f"Adaptive rate: {self.rate}")
+        super(SessionWithBase, self).close()
+
+
+def create_adaptive_rate(config: SpotifyConfig) -> AdaptiveRate:
+    """
+    Returns: an adaptive rate starting at the configured bucket rate, and at least one request per bucket
+    """
+    bucket_seconds = config.rate_limit_bucket_size_seconds
+    return AdaptiveRate(
+        rate=config.rate_limit_requests_per_bucket / bucket_seconds,
+        min_rate=1 / bucket_seconds,
+        increase=config.rate_limit_increase,
+        decrease=config.rate_limit_decrease,
+    )
+
+
+def wire_size(response: requests.Response) -> int:
+    """
+    Returns: the size of the response body as received, i.e. compressed if it was encoded
+    """
+    content = response.content
+    try:
+        return response.raw.tell()
+    except (AttributeError, OSError):
+        return len(content or b"")
+
+
+def get_response_model(response: requests.Response, adapter: TypeAdapter[T]) -> T:
+    """
+    Returns: the response validated in a single pass from its bytes
+    """
+    response.raise_for_status()
+    return adapter.validate_json(response.content)
+
+
+def get_json_loads(decoder: JsonDecoder) -> Callable[[bytes], Any]:
+    """
+    Returns: the function decoding JSON bytes, with the stdlib if the decoder is not installed
+    """
+    try:
+        match decoder:
+            case JsonDecoder.orjson:
+                import orjson
+
+                return orjson.loads
+            case JsonDecoder.msgspec:
+                import msgspec
+
+                return msgspec.json.decode
+    except ImportError:
+        logger.warning(f"JSON decoder {decoder} is not installed, using the stdlib")
+    return json.loads
 
 
-def get_response_dict(response: requests.Response) -> dict[any]:
+def get_response_dict(
+    response: requests.Response, json_loads: Callable[[bytes], Any] = json.loads
+) -> dict[any]:
     response.raise_for_status()
-    data = response.json()
+    data = json_loads(response.content)
     assert isinstance(data, dict)
     return data
@@ -0,0 +1,78 @@
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+from paddle.downloader.models import Playlist
+from paddle.downloader.rows import TrackRow
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """
+    Persists every downloaded playlist with its track rows by the playlist's snapshot_id in SQLite.
+    Playlists whose snapshot_id did not change since the last run can thus be re-emitted
+    without requesting their details or tracks again.
+    """
+
+    connection: sqlite3.Connection
+    lock: threading.Lock
+
+    def __init__(self, path: Path):
+        # the store is shared by the download workers, which is serialized by the lock,
+        # and by the worker processes, which wait for each other's writes
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            # the rows are stored as JSON arrays of the TrackRow columns
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS playlist_rows (
+                    id TEXT PRIMARY KEY,
+                    snapshot_id TEXT NOT NULL,
+                    playlist TEXT NOT NULL,
+                    rows TEXT NOT NULL
+                )
+                """
+            )
+
+    def get(
+        self, playlist_id: str, snapshot_id: str
+    ) -> tuple[Playlist, list[TrackRow]] | None:
+        """
+        Returns: the stored playlist and track rows, if the stored snapshot_id is still the same
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT playlist, rows FROM playlist_rows WHERE id = ? AND snapshot_id = ?",
+                (playlist_id, snapshot_id),
+            ).fetchone()
+        if row is None:
+            return None
+        playlist, rows = row
+        return Playlist.model_validate_json(playlist), [
+            TrackRow.fromtuple(values) for values in json.loads(rows)
+        ]
+
+    def put(self, playlist: Playlist, rows: list[TrackRow]):
+        with self.lock, self.connection:
+            stored = self.connection.execute(
+                "SELECT snapshot_id FROM playlist_rows WHERE id = ?", (playlist.id,)
+            ).fetchone()
+            if stored is not None and stored[0] == playlist.snapshot_id:
+                return
+            self.connection.execute(
+                "INSERT OR REPLACE INTO playlist_rows VALUES (?, ?, ?, ?)",
+                (
+                    playlist.id,
+                    playlist.snapshot_id,
+                    playlist.model_dump_json(),
+                    json.dumps([row.astuple() for row in rows]),
+                ),
+            )
+
+    def close(self):
+        self.connection.close()
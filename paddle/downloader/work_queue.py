@@ -0,0 +1,92 @@
+import sqlite3
+from pathlib import Path
+
+from paddle.downloader.models import SimplifiedPlaylist
+
+
+class WorkQueue:
+    """
+    Durable queue of the playlists to download, shared by the worker processes in SQLite.
+    Every playlist is queued once, and stays assigned to the worker which claimed it,
+    so the playlists of a dead worker can be requeued.
+    """
+
+    connection: sqlite3.Connection
+
+    def __init__(self, path: Path):
+        # in autocommit mode, claims are serialized by their immediate transaction.
+        # The playlists are claimed by the thread fetching them, one thread at a time
+        self.connection = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS playlists (
+                id TEXT PRIMARY KEY,
+                playlist TEXT NOT NULL,
+                worker INTEGER
+            )
+            """
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS finished (finished INTEGER NOT NULL)"
+        )
+
+    def put(self, item: SimplifiedPlaylist) -> bool:
+        """
+        Returns: whether the playlist was queued, i.e. it was not queued before
+        """
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO playlists (id, playlist) VALUES (?, ?)",
+            (item.id, item.model_dump_json()),
+        )
+        return cursor.rowcount == 1
+
+    def finish(self):
+        """
+        Marks that no more playlists are queued, so idle workers can exit.
+        """
+        self.connection.execute("INSERT INTO finished VALUES (1)")
+
+    def claim(self, worker: int) -> SimplifiedPlaylist | None:
+        """
+        Returns: the next unclaimed playlist in queue order, assigned to the worker
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT rowid, playlist FROM playlists WHERE worker IS NULL "
+                "ORDER BY rowid LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE playlists SET worker = ? WHERE rowid = ?", (worker, row[0])
+                )
+        finally:
+            self.connection.execute("COMMIT")
+        return SimplifiedPlaylist.model_validate_json(row[1]) if row else None
+
+    def is_finished(self) -> bool:
+        """
+        Returns: whether no more playlists are queued and all of them are claimed
+        """
+        return (
+            self.connection.execute("SELECT 1 FROM finished").fetchone() is not None
+            and self.connection.execute(
+                "SELECT 1 FROM playlists WHERE worker IS NULL"
+            ).fetchone()
+            is None
+        )
+
+    def requeue(self, worker: int) -> int:
+        """
+        Returns: the number of playlists of the worker put back into the queue
+        """
+        cursor = self.connection.execute(
+            "UPDATE playlists SET worker = NULL WHERE worker = ?", (worker,)
+        )
+        return cursor.rowcount
+
+    def close(self):
+        self.connection.close()
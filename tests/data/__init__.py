@@ -1,5 +1,12 @@
 import tests.data.users as users
-from .artists import create_artist, artist_1, artist_2, artist_3, artist_4
+from .artists import (
+    create_artist,
+    create_full_artist,
+    artist_1,
+    artist_2,
+    artist_3,
+    artist_4,
+)
 from .images import dummy_images
 from .markets import available_markets
 from .playlists import (
@@ -11,7 +18,9 @@ from .playlists import (
 )
 from .tracks import (
     create_track,
+    create_track_item,
     create_album,
+    create_full_album,
     dummy_track_1,
     dummy_track_2,
     dummy_track_3,
@@ -28,3 +37,37 @@ def create_items_no_pagination(items: list[any], href: str) -> dict[any]:
         "previous": None,
         "total": len(items),
     }
+
+
+def create_page(
+    items: list[any], href: str, offset: int, limit: int, total: int
+) -> dict[any]:
+    """
+    Creates one page of a paginated response, `href` being the URL without query parameters.
+    """
+    next_offset = offset + limit
+    return {
+        "href": f"{href}?offset={offset}&limit={limit}",
+        "items": items,
+        "limit": limit,
+        "next": f"{href}?offset={next_offset}&limit={limit}"
+        if next_offset < total
+        else None,
+        "offset": offset,
+        "previous": f"{href}?offset={max(offset - limit, 0)}&limit={limit}"
+        if offset > 0
+        else None,
+        "total": total,
+    }
+
+
+def create_numbered_track(num: int) -> dict[any]:
+    artist = create_artist(num)
+    return create_track_item(
+        create_track(
+            num=num,
+            popularity=num % 100,
+            album=create_album(num, artists=[artist]),
+            artists=[artist],
+        )
+    )
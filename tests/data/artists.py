@@ -1,3 +1,6 @@
+from tests.data.images import dummy_images
+
+
 def create_artist(num: int):
     sid = f"ARTISTID{num}"
     return {
@@ -14,3 +17,14 @@ artist_1 = create_artist(num=1)
 artist_2 = create_artist(num=2)
 artist_3 = create_artist(num=3)
 artist_4 = create_artist(num=4)
+
+
+def create_full_artist(sid: str):
+    num = int(sid.removeprefix("ARTISTID"))
+    return {
+        **create_artist(num),
+        "followers": {"href": None, "total": num * 10},
+        "genres": ["latin", "reggaeton"],
+        "images": dummy_images,
+        "popularity": num % 100,
+    }
@@ -1,5 +1,5 @@
 import tests.data.users as users
-from tests.data import artist_1, artist_2, artist_3, artist_4
+from tests.data import artist_1, artist_2, artist_3, artist_4, create_artist
 from tests.data.images import dummy_images
 from tests.data.markets import available_markets
 
@@ -91,3 +91,15 @@ dummy_track_3 = create_track_item(
         num=3, popularity=78, album=dummy_album_3, artists=dummy_album_3["artists"]
     )
 )
+
+
+def create_full_album(sid: str):
+    num = int(sid.removeprefix("ALBUMID"))
+    return {
+        **create_album(num, artists=[create_artist(num)]),
+        "copyrights": [{"text": f"(C) Label {num}", "type": "C"}],
+        "external_ids": {"upc": f"UPC{num}"},
+        "genres": [],
+        "label": f"Label {num}",
+        "popularity": num % 100,
+    }
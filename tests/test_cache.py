@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import responses
+from responses import matchers
+
+from paddle.downloader.cache import ResponseCache
+from paddle.downloader.config import SpotifyConfig
+from paddle.downloader.session import SessionWithBase, get_response_dict
+
+base_url = "https://api.spotify.com/v1/"
+
+
+def create_session(cache_dir: Path) -> SessionWithBase:
+    config = SpotifyConfig(client_id="X", client_secret="X", cache_dir=cache_dir)
+    session = SessionWithBase(config=config)
+    session.cache = ResponseCache(cache_dir, max_bytes=config.cache_max_bytes)
+    return session
+
+
+@responses.activate
+def test_revalidation(tmp_path: Path):
+    responses.get(
+        f"{base_url}playlists/PLAYLIST_ID1",
+        match=[matchers.header_matcher({"If-None-Match": '"v1"'})],
+        status=304,
+    )
+    responses.get(
+        f"{base_url}playlists/PLAYLIST_ID1",
+        json={"id": "PLAYLIST_ID1"},
+        headers={"ETag": '"v1"'},
+    )
+
+    session = create_session(tmp_path)
+    assert get_response_dict(session.get("playlists/PLAYLIST_ID1")) == {
+        "id": "PLAYLIST_ID1"
+    }
+    # the cache persists across sessions
+    session = create_session(tmp_path)
+    assert get_response_dict(session.get("playlists/PLAYLIST_ID1")) == {
+        "id": "PLAYLIST_ID1"
+    }
+    assert session.cache.stats.hits == 1
+    assert session.cache.stats.misses == 0
+    assert session.cache.stats.revalidations == 1
+    assert [call.request.headers.get("If-None-Match") for call in responses.calls] == [
+        None,
+        '"v1"',
+    ]
+
+
+def test_eviction(tmp_path: Path):
+    cache = ResponseCache(tmp_path, max_bytes=10)
+    cache.put("url1", '"v1"', b"body-1")
+    cache.put("url2", '"v2"', b"body-2")
+    assert cache.get("url1") is None
+    entry = cache.get("url2")
+    assert entry.etag == '"v2"'
+    assert cache.load(entry) == b"body-2"
+    assert len(list(tmp_path.glob("*.body"))) == 1
+    assert str(cache.stats) == "1 hits, 1 misses, 1 revalidations"
+
+
+@responses.activate
+def test_missing_body(tmp_path: Path):
+    responses.get(
+        f"{base_url}playlists/PLAYLIST_ID1",
+        match=[matchers.header_matcher({"If-None-Match": '"v1"'})],
+        status=304,
+    )
+    responses.get(
+        f"{base_url}playlists/PLAYLIST_ID1",
+        json={"id": "PLAYLIST_ID1"},
+        headers={"ETag": '"v2"'},
+    )
+
+    session = create_session(tmp_path)
+    session.cache.put(f"{base_url}playlists/PLAYLIST_ID1", '"v1"', b"{}")
+    # the body is evicted by another worker once the request is revalidated
+    next(tmp_path.glob("*.body")).unlink()
+    assert get_response_dict(session.get("playlists/PLAYLIST_ID1")) == {
+        "id": "PLAYLIST_ID1"
+    }
+    assert [call.request.headers.get("If-None-Match") for call in responses.calls] == [
+        '"v1"',
+        None,
+    ]
+    assert str(session.cache.stats) == "0 hits, 1 misses, 1 revalidations"
+    assert session.cache.get(f"{base_url}playlists/PLAYLIST_ID1").etag == '"v2"'
+
+
+def test_evicted_entry(tmp_path: Path):
+    cache = ResponseCache(tmp_path, max_bytes=10)
+    cache.put("url1", '"v1"', b"body-1")
+    entry = cache.get("url1")
+    cache.put("url2", '"v2"', b"body-2")
+    # evicted by another worker once revalidated
+    assert cache.load(entry) is None
+    assert cache.get("url1") is None
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [".body", ".etag"]
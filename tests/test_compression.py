@@ -0,0 +1,44 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+import paddle.downloader.compression as compression
+from paddle.downloader.compression import (
+    ParallelBlockWriter,
+    get_compress,
+    open_compressed,
+)
+from paddle.downloader.config import FileType
+
+MAGIC = {
+    FileType.csvgz: b"\x1f\x8b\x08",
+    FileType.csvzst: b"\x28\xb5\x2f\xfd",
+    FileType.csvlz4: b"\x04\x22\x4d\x18",
+}
+
+
+@pytest.mark.parametrize(
+    "file_type", [FileType.csvgz, FileType.csvzst, FileType.csvlz4]
+)
+def test_parallel_blocks(tmp_path: Path, monkeypatch, file_type: FileType):
+    monkeypatch.setattr(compression, "BLOCK_SIZE", 100)
+    path = tmp_path / f"table.{file_type.value}"
+    rows = [(f"ID{num}", f"Name {num}", num) for num in range(1000)]
+    with ParallelBlockWriter(path, get_compress(file_type, None), workers=3) as f:
+        writer = csv.writer(f)
+        writer.writerows(rows)
+    # the blocks are written as several members (or frames), read as one stream
+    assert path.read_bytes().count(MAGIC[file_type]) > 1
+    with open_compressed(path, file_type) as f:
+        assert [tuple(row) for row in csv.reader(f)] == [
+            (sid, name, str(num)) for sid, name, num in rows
+        ]
+
+
+def test_compression_level():
+    assert get_compress(FileType.csvgz, 1)(b"abc")
+    with pytest.raises(ValueError):
+        get_compress(FileType.csvgz, 10)
+    with pytest.raises(ValueError):
+        get_compress(FileType.csvzst, 0)
@@ -0,0 +1,81 @@
+import random
+import string
+from pathlib import Path
+
+from paddle.downloader.dedup import IdSet, pack_id
+
+# the base62 digits of the Spotify IDs
+ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+
+
+def create_id(value: int) -> str:
+    digits = []
+    for _ in range(22):
+        value, digit = divmod(value, 62)
+        digits.append(ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+def random_ids(num: int) -> list[str]:
+    rng = random.Random(42)
+    return [create_id(rng.getrandbits(128)) for _ in range(num)]
+
+
+def test_pack_id():
+    assert pack_id("4iV5W9uYEdYUVa79Axb7Rh") == pack_id("4iV5W9uYEdYUVa79Axb7Rh")
+    assert len(pack_id(create_id(12345))) == 17
+    ids = random_ids(1000)
+    assert len({pack_id(sid) for sid in ids}) == len(set(ids))
+    assert pack_id("TRACKID1") is None
+    assert pack_id("PLAYLIST_ID1234567890X") is None
+    assert pack_id(None) is None
+
+
+def test_id_set():
+    ids = IdSet()
+    keys = list(zip(random_ids(3000), random_ids(3000)[::-1]))
+    assert all(ids.add(key) for key in keys)
+    # the key of an ID which is not a Spotify ID
+    assert ids.add(("PLAYLIST_ID1", keys[0][1]))
+    assert not any(ids.add(key) for key in keys)
+    assert not ids.add(("PLAYLIST_ID1", keys[0][1]))
+    assert len(ids) == 3001
+    assert keys[10] in ids
+    assert (keys[10][0], keys[11][1]) not in ids
+
+
+def test_spilled_id_set(tmp_path: Path):
+    spill_path = tmp_path / "keys.sqlite"
+    ids = IdSet(max_keys=100, spill_path=spill_path)
+    keys = random_ids(2000)
+    assert all(ids.add(key) for key in keys)
+    assert len(ids.keys) < 100
+    assert spill_path.exists()
+    assert not any(ids.add(key) for key in keys)
+    assert len(ids) == 2000
+    ids.close()
+    assert not spill_path.exists()
+
+
+def test_persistent_id_set(tmp_path: Path):
+    index_path = tmp_path / "keys.sqlite"
+    keys = list(zip(random_ids(500), random_ids(500)[::-1]))
+    ids = IdSet(spill_path=index_path, persistent=True)
+    assert all(ids.add(key) for key in keys[:300])
+    assert ids.add(("PLAYLIST_ID1", keys[0][1]))
+    ids.close()
+    assert index_path.exists()
+
+    ids = IdSet(max_keys=100, spill_path=index_path, persistent=True)
+    assert len(ids) == 301
+    assert not ids.add(("PLAYLIST_ID1", keys[0][1]))
+    assert [ids.add(key) for key in keys] == [False] * 300 + [True] * 200
+    ids.close()
+    assert len(IdSet(spill_path=index_path, persistent=True)) == 501
+
+    # the committed keys are kept without closing the set
+    ids = IdSet(spill_path=index_path, persistent=True)
+    assert ids.add("PLAYLIST_ID2")
+    assert ids.add(keys[0][0])
+    ids.commit()
+    assert len(IdSet(spill_path=index_path, persistent=True)) == 503
@@ -0,0 +1,38 @@
+from paddle.downloader.enrichment import Enrichment, IdBatcher
+from paddle.downloader.main import enrich_rows
+from paddle.downloader.records import RecordBuilder
+
+
+def test_full_batches():
+    batcher = IdBatcher(batch_size=2)
+    assert list(batcher.add(["A", "B", "A", "C"])) == [["A", "B"]]
+    assert list(batcher.add(["B", "C"])) == []
+    assert list(batcher.flush()) == [["C"]]
+    assert list(batcher.flush()) == []
+
+
+def test_max_latency():
+    batcher = IdBatcher(batch_size=20, max_latency=0)
+    assert list(batcher.add(["A", "B"])) == [["A", "B"]]
+    assert list(batcher.add([])) == []
+    assert list(batcher.add(["A", "C"])) == [["C"]]
+
+
+class AlbumsClient:
+    def __init__(self):
+        self.batches = []
+
+    def get_albums(self, album_ids: list[str]) -> list:
+        self.batches.append(album_ids)
+        return []
+
+
+def test_playlist_without_rows():
+    enrichment = Enrichment(albums=IdBatcher(batch_size=20, max_latency=60))
+    assert list(enrichment.albums.add(["ALBUMID1"])) == []
+    enrichment.albums.max_latency = 0
+    client = AlbumsClient()
+
+    # the pending album is due after a playlist without rows as well
+    assert list(enrich_rows(client, RecordBuilder(builders=[]), enrichment, [])) == []
+    assert client.batches == [["ALBUMID1"]]
@@ -1,11 +1,21 @@
+import asyncio
+import copy
 import gzip
+import json
+import logging
 import os
+import sqlite3
+import threading
+from dataclasses import replace
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import TYPE_CHECKING
 from unittest import mock
 from unittest.mock import patch
 
 import pytest
 import responses
+from responses import matchers
 from responses.registries import OrderedRegistry
 
 import tests.data as data
@@ -14,7 +24,22 @@ import tests.data.playlists
 import tests.data.tracks
 import tests.data.users
 from paddle.downloader import main, run
-from paddle.downloader.config import SpotifyConfig, Config
+from paddle.downloader.config import SpotifyConfig, Config, Pagination, FileType
+from paddle.downloader.main import create_record_builder
+from paddle.downloader.models import Page
+from paddle.downloader.pagination import offset_urls, prefetch
+from paddle.downloader.processes import merge_tables
+from paddle.downloader.records import (
+    INDEX_DIR,
+    RecordWriter,
+    TracksRecords,
+    read_table,
+    table_names,
+)
+from paddle.downloader.session import RateLimitError
+
+if TYPE_CHECKING:
+    import httpx
 
 auth_url = "https://accounts.spotify.com/api/token"
 base_url = "https://api.spotify.com/v1/"
@@ -44,6 +69,118 @@ def mocked_responses():
         assert auth.call_count == 1, "Access token should be requested exactly once"
 
 
+@pytest.fixture
+def unordered_responses():
+    """
+    Mocked responses matched by URL instead of by order, for concurrent downloads.
+    """
+    with responses.RequestsMock() as rs:
+        rs.post(auth_url, json={"access_token": "XYZ"})
+        yield rs
+
+
+def category_routes(
+    num_playlists: int, tracks_per_playlist: int, page_size: int
+) -> list[tuple[str, dict[str, str] | None, dict[any]]]:
+    """
+    Creates the (URL, query parameters, JSON body) routes of a category with `num_playlists`
+    playlists, each having `tracks_per_playlist` distinct tracks.
+    Both the playlists and the tracks are split into pages of `page_size`.
+    """
+    playlists = [
+        data.create_playlist(num=num, tracks=None)
+        for num in range(1, num_playlists + 1)
+    ]
+    playlists_url = f"{base_url}browse/categories/{default_category}/playlists"
+    routes = []
+    for offset in range(0, num_playlists, page_size):
+        page = data.create_page(
+            items=playlists[offset : offset + page_size],
+            href=playlists_url,
+            offset=offset,
+            limit=page_size,
+            total=num_playlists,
+        )
+        params = (
+            {"offset": str(offset), "limit": str(page_size)}
+            if offset > 0
+            else {"limit": "50"}
+        )
+        routes.append((playlists_url, params, {"playlists": page}))
+    for num, playlist in enumerate(playlists, start=1):
+        tracks_url = f"{base_url}playlists/{playlist['id']}/tracks"
+        items = [
+            data.create_numbered_track(num * 1000 + i)
+            for i in range(tracks_per_playlist)
+        ]
+        pages = [
+            data.create_page(
+                items=items[offset : offset + page_size],
+                href=tracks_url,
+                offset=offset,
+                limit=page_size,
+                total=len(items),
+            )
+            for offset in range(0, max(len(items), 1), page_size)
+        ]
+        routes.append(
+            (
+                f"{base_url}playlists/{playlist['id']}",
+                None,
+                {**playlist, "tracks": pages[0]},
+            )
+        )
+        for page in pages[1:]:
+            params = {"offset": str(page["offset"]), "limit": str(page_size)}
+            routes.append((tracks_url, params, page))
+    return routes
+
+
+def mock_category(
+    rs: responses.RequestsMock,
+    num_playlists: int,
+    tracks_per_playlist: int,
+    page_size: int,
+):
+    for url, params, body in category_routes(
+        num_playlists, tracks_per_playlist, page_size
+    ):
+        match = [matchers.query_param_matcher(params)] if params else []
+        rs.get(url, match=match, json=body)
+
+
+def routes_transport(
+    routes: list[tuple[str, dict[str, str] | None, dict[any]]]
+) -> "httpx.MockTransport":
+    """
+    Serves the routes (and the access token) as a local HTTP stand-in for httpx.
+    """
+    httpx = pytest.importorskip("httpx")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if str(request.url) == auth_url:
+            return httpx.Response(200, json={"access_token": "XYZ"})
+        url = str(request.url.copy_with(query=None))
+        for route_url, params, body in routes:
+            if route_url == url and (
+                params is None or params == dict(request.url.params)
+            ):
+                return httpx.Response(200, json=body)
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+def import_aio():
+    """
+    Returns: the asyncio engine, skipping the rest of the test without the `async` extra
+    """
+    pytest.importorskip("httpx")
+    from paddle.downloader import aio
+
+    return aio
+
+
 def read_tables(tmp_path: Path) -> dict[str, list[str]]:
     result = {}
     for file in tmp_path.glob("*.csv.gz"):
@@ -261,10 +398,20 @@ def test_rate_limit(mocked_responses: responses.RequestsMock, tmp_path: Path):
         rate_limit_bucket_size_seconds=1,
     )
     config = Config(spotify=spotify_config, output_dir=tmp_path)
-    with patch("time.sleep", return_value=None) as patched_time_sleep:
+    sleeping_threads = set()
+
+    def sleep(seconds: float):
+        sleeping_threads.add(threading.current_thread().name)
+
+    with patch("time.sleep", side_effect=sleep) as patched_time_sleep:
         run(config)
-        patched_time_sleep.assert_called_with(42)
-        assert patched_time_sleep.call_count == 1
+        # the requests are parked until the end of the cooldown of the host,
+        # which does not end here as the patched sleep does not pass any time
+        assert patched_time_sleep.call_args_list[0].args[0] == pytest.approx(42, abs=1)
+        for call in patched_time_sleep.call_args_list:
+            assert 0 < call.args[0] <= 42
+    # the requests are parked on the thread fetching ahead, not on the one building the records
+    assert sleeping_threads == {"prefetch"}
 
     expected_tables = {
         "artists_records": ["id,name", "ARTISTID1,Artist 1", "ARTISTID2,Artist 2"],
@@ -349,3 +496,649 @@ def test_duplicates(mocked_responses: responses.RequestsMock, tmp_path: Path):
         ],
     }
     assert read_tables(tmp_path) == expected_tables
+
+
+def test_concurrent_workers(
+    unordered_responses: responses.RequestsMock, tmp_path: Path
+):
+    mock_category(
+        unordered_responses, num_playlists=5, tracks_per_playlist=7, page_size=3
+    )
+    sequential_path = tmp_path / "sequential"
+    concurrent_path = tmp_path / "concurrent"
+    sequential_path.mkdir()
+    concurrent_path.mkdir()
+    main(["-o", str(sequential_path)])
+    main(["-o", str(concurrent_path), "--workers", "3"])
+    sequential_tables = read_tables(sequential_path)
+    assert len(sequential_tables["playlist_track_id_records"]) == 1 + 5 * 7
+    assert read_tables(concurrent_path) == sequential_tables
+
+
+def test_asyncio_engine(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    routes = category_routes(num_playlists=4, tracks_per_playlist=5, page_size=2)
+    mock_category(
+        unordered_responses, num_playlists=4, tracks_per_playlist=5, page_size=2
+    )
+    sequential_path = tmp_path / "sequential"
+    async_path = tmp_path / "async"
+    sequential_path.mkdir()
+    async_path.mkdir()
+    main(["-o", str(sequential_path)])
+
+    aio = import_aio()
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=async_path,
+        workers=3,
+    )
+    builder = create_record_builder(config)
+    asyncio.run(aio.download(config, builder, transport=routes_transport(routes)))
+    builder.close()
+    assert read_tables(async_path) == read_tables(sequential_path)
+
+
+def test_asyncio_rate_limit(tmp_path: Path):
+    httpx = pytest.importorskip("httpx")
+    aio = import_aio()
+    routes = category_routes(num_playlists=1, tracks_per_playlist=1, page_size=1)
+    handler = routes_transport(routes).handler
+    rate_limited = []
+
+    def rate_limiting_handler(request: httpx.Request) -> httpx.Response:
+        if "browse" in request.url.path and not rate_limited:
+            rate_limited.append(request)
+            return httpx.Response(429, headers={"Retry-After": "42"})
+        return handler(request)
+
+    # As in test_rate_limit, the filled limiter bucket makes us wait an actual second
+    spotify_config = SpotifyConfig(
+        client_id="X",
+        client_secret="X",
+        rate_limit_requests_per_bucket=20,
+        rate_limit_bucket_size_seconds=1,
+    )
+    config = Config(spotify=spotify_config, output_dir=tmp_path)
+    builder = create_record_builder(config)
+    with patch("asyncio.sleep") as patched_sleep:
+        asyncio.run(
+            aio.download(
+                config, builder, transport=httpx.MockTransport(rate_limiting_handler)
+            )
+        )
+        assert any(
+            call.args[0] == pytest.approx(42, abs=1)
+            for call in patched_sleep.call_args_list
+        )
+    builder.close()
+    assert read_tables(tmp_path)["playlist_track_id_records"] == [
+        "playlist_id,playlist_added_at,track_id",
+        "PLAYLIST_ID1,2023-07-07T04:00:00+00:00,TRACKID1000",
+    ]
+
+
+def test_offset_pagination(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    routes = category_routes(num_playlists=5, tracks_per_playlist=11, page_size=2)
+    mock_category(
+        unordered_responses, num_playlists=5, tracks_per_playlist=11, page_size=2
+    )
+    sequential_path = tmp_path / "sequential"
+    offset_path = tmp_path / "offset"
+    async_path = tmp_path / "async"
+    for path in (sequential_path, offset_path, async_path):
+        path.mkdir()
+    main(["-o", str(sequential_path)])
+    main(["-o", str(offset_path), "--pagination", "offset", "--page-workers", "3"])
+    sequential_tables = read_tables(sequential_path)
+    assert len(sequential_tables["playlist_records"]) == 1 + 5
+    assert len(sequential_tables["playlist_track_id_records"]) == 1 + 5 * 11
+    assert read_tables(offset_path) == sequential_tables
+
+    aio = import_aio()
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=async_path,
+        pagination=Pagination.offset,
+        page_workers=3,
+    )
+    builder = create_record_builder(config)
+    asyncio.run(aio.download(config, builder, transport=routes_transport(routes)))
+    builder.close()
+    assert read_tables(async_path) == sequential_tables
+
+
+def test_offset_urls():
+    page = data.create_page(
+        items=[], href=f"{base_url}playlists/X/tracks", offset=0, limit=100, total=250
+    )
+    page["next"] += "&market=DE"
+    page = Page.model_validate(page)
+    assert offset_urls(page) == [
+        f"{base_url}playlists/X/tracks?offset=100&limit=100&market=DE",
+        f"{base_url}playlists/X/tracks?offset=200&limit=100&market=DE",
+    ]
+    assert offset_urls(page.model_copy(update={"next": None})) == []
+
+
+def test_prefetch():
+    processed = threading.Event()
+
+    def items():
+        yield 1
+        # blocks like a parked request, until the first item is processed
+        assert processed.wait(timeout=5)
+        yield 2
+        raise ValueError("failed")
+
+    prefetched = prefetch(items(), size=2)
+    assert next(prefetched) == 1
+    processed.set()
+    assert next(prefetched) == 2
+    with pytest.raises(ValueError):
+        next(prefetched)
+
+
+def test_snapshot_state(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    routes = category_routes(num_playlists=3, tracks_per_playlist=4, page_size=2)
+    mock_category(
+        unordered_responses, num_playlists=3, tracks_per_playlist=4, page_size=2
+    )
+    state_path = tmp_path / "state.sqlite"
+    first_path = tmp_path / "first"
+    second_path = tmp_path / "second"
+    first_path.mkdir()
+    second_path.mkdir()
+    main(["-o", str(first_path), "--state", str(state_path)])
+
+    # only the listing is served, with a new snapshot of the second playlist
+    unordered_responses.reset()
+    unordered_responses.post(auth_url, json={"access_token": "XYZ"})
+    for url, params, body in routes:
+        if "PLAYLIST_ID2" in url:
+            body = {**body, "snapshot_id": "PLAYLIST_SNAPSHOT_ID2_NEW"}
+        elif "playlists/" in url:
+            continue
+        else:
+            body = copy.deepcopy(body)
+            for item in body["playlists"]["items"]:
+                if item["id"] == "PLAYLIST_ID2":
+                    item["snapshot_id"] = "PLAYLIST_SNAPSHOT_ID2_NEW"
+        match = [matchers.query_param_matcher(params)] if params else []
+        unordered_responses.get(url, match=match, json=body)
+    main(["-o", str(second_path), "--state", str(state_path)])
+
+    first_tables = read_tables(first_path)
+    second_tables = read_tables(second_path)
+    assert len(first_tables["playlist_track_id_records"]) == 1 + 3 * 4
+    assert second_tables["category_playlists_records"] == [
+        row.replace("PLAYLIST_SNAPSHOT_ID2", "PLAYLIST_SNAPSHOT_ID2_NEW")
+        for row in first_tables["category_playlists_records"]
+    ]
+    del first_tables["category_playlists_records"]
+    del second_tables["category_playlists_records"]
+    assert second_tables == first_tables
+
+
+def test_enrich_artists(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    mock_category(
+        unordered_responses, num_playlists=3, tracks_per_playlist=30, page_size=20
+    )
+
+    def artists_callback(request):
+        ids = request.params["ids"].split(",")
+        assert len(ids) <= 50
+        artists = [data.create_full_artist(sid) for sid in ids]
+        return 200, {}, json.dumps({"artists": artists})
+
+    unordered_responses.add_callback(
+        responses.GET, f"{base_url}artists", callback=artists_callback
+    )
+    main(["-o", str(tmp_path), "--enrich-artists"])
+
+    artists_records = read_tables(tmp_path)["artists_records"]
+    assert artists_records[:2] == [
+        "id,name,followers,genres,popularity,image_url",
+        "ARTISTID1000,Artist 1000,10000,latin;reggaeton,0,https://i.scdn.co/image/IMAGEID1",
+    ]
+    assert len(artists_records) == 1 + 3 * 30
+    artists_calls = [
+        call for call in unordered_responses.calls if "/artists?" in call.request.url
+    ]
+    assert len(artists_calls) == 2
+
+
+def test_enrich_albums(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    mock_category(
+        unordered_responses, num_playlists=2, tracks_per_playlist=25, page_size=10
+    )
+
+    def albums_callback(request):
+        ids = request.params["ids"].split(",")
+        assert len(ids) <= 20
+        albums = [data.create_full_album(sid) for sid in ids]
+        return 200, {}, json.dumps({"albums": albums})
+
+    unordered_responses.add_callback(
+        responses.GET, f"{base_url}albums", callback=albums_callback
+    )
+    main(["-o", str(tmp_path), "--enrich-albums"])
+
+    albums_records = read_tables(tmp_path)["albums_records"]
+    assert albums_records[:2] == [
+        "id,name,album_type,label,genres,popularity,release_date,release_date_precision,"
+        "total_tracks,upc,copyrights",
+        "ALBUMID1000,Album 1000,single,Label 1000,,0,2023-06-23,day,1,UPC1000,(C) Label 1000",
+    ]
+    assert len(albums_records) == 1 + 2 * 25
+    albums_calls = [
+        call for call in unordered_responses.calls if "/albums?" in call.request.url
+    ]
+    assert len(albums_calls) == 3
+
+
+def test_project_fields(
+    unordered_responses: responses.RequestsMock, tmp_path: Path, caplog
+):
+    caplog.set_level(logging.INFO)
+    # the routes ignore the `fields` parameter, the projection is checked by test_projection
+    for url, params, body in category_routes(
+        num_playlists=2, tracks_per_playlist=5, page_size=2
+    ):
+        match = [matchers.query_param_matcher(params, strict_match=False)]
+        unordered_responses.get(url, match=match if params else [], json=body)
+    full_path = tmp_path / "full"
+    projected_path = tmp_path / "projected"
+    full_path.mkdir()
+    projected_path.mkdir()
+    main(["-o", str(full_path)])
+    unordered_responses.calls.reset()
+    main(["-o", str(projected_path), "--project-fields"])
+
+    assert read_tables(projected_path) == read_tables(full_path)
+    playlist_calls = [
+        call
+        for call in unordered_responses.calls
+        if "/playlists/PLAYLIST_ID" in call.request.url
+    ]
+    assert len(playlist_calls) == 2 * 3
+    for call in playlist_calls:
+        assert "fields" in call.request.params
+    assert "HTTP transfer: 7 requests" in caplog.text
+
+
+def test_processes(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    routes = category_routes(num_playlists=6, tracks_per_playlist=5, page_size=2)
+    killed_path = tmp_path / "killed"
+    playlist_url, _, playlist_body = next(
+        route for route in routes if route[0].endswith("playlists/PLAYLIST_ID2")
+    )
+
+    def kill_once(_request):
+        # the first worker fetching the playlist dies, its playlists are requeued
+        if not killed_path.exists():
+            killed_path.touch()
+            os._exit(1)
+        return 200, {}, json.dumps(playlist_body)
+
+    unordered_responses.add_callback(responses.GET, playlist_url, callback=kill_once)
+    for url, params, body in routes:
+        if url != playlist_url:
+            match = [matchers.query_param_matcher(params)] if params else []
+            unordered_responses.get(url, match=match, json=body)
+    processes_path = tmp_path / "processes"
+    sequential_path = tmp_path / "sequential"
+    processes_path.mkdir()
+    sequential_path.mkdir()
+    # the workers share the snapshot store
+    state_path = tmp_path / "state.sqlite"
+    main(["-o", str(processes_path), "-p", "3", "--state", str(state_path)])
+    main(["-o", str(sequential_path)])
+
+    assert killed_path.exists()
+    with sqlite3.connect(state_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM playlist_rows").fetchone() == (
+            6,
+        )
+    assert sorted(processes_path.iterdir()) == sorted(
+        processes_path / file.name for file in sequential_path.iterdir()
+    )
+    sequential_tables = read_tables(sequential_path)
+    assert len(sequential_tables["playlist_track_id_records"]) == 1 + 6 * 5
+    for table_name, lines in read_tables(processes_path).items():
+        expected = sequential_tables[table_name]
+        assert lines[0] == expected[0]
+        assert sorted(lines[1:]) == sorted(expected[1:])
+
+
+def test_merge_tables(tmp_path: Path):
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"), output_dir=tmp_path
+    )
+    worker_configs = []
+    # the workers fetched the same track at different times, with different popularities
+    for worker, popularity in enumerate((50, 51)):
+        worker_config = replace(config, output_dir=tmp_path / f"worker-{worker}")
+        worker_config.output_dir.mkdir()
+        writer = RecordWriter(
+            worker_config, "tracks_records", TracksRecords.table.columns
+        )
+        writer.writerow(("album", "TRACKID1", "Track 1", popularity, "uri1"))
+        writer.writerow(("album", f"TRACKID{worker + 2}", "Track", 10, "uri"))
+        writer.close()
+        worker_configs.append(worker_config)
+
+    merge_tables(config, worker_configs)
+
+    _, rows = read_table(config, "tracks_records")
+    assert [row[1:4] for row in rows] == [
+        ("TRACKID1", "Track 1", "50"),
+        ("TRACKID2", "Track", "10"),
+        ("TRACKID3", "Track", "10"),
+    ]
+
+
+def test_adaptive_rate_limit(
+    unordered_responses: responses.RequestsMock, tmp_path: Path, caplog
+):
+    caplog.set_level(logging.INFO)
+    unordered_responses.get(
+        f"{base_url}browse/categories/{default_category}/playlists",
+        status=429,
+        headers={"Retry-After": "42"},
+        match=[matchers.query_param_matcher({"limit": "50"})],
+    )
+    mock_category(
+        unordered_responses, num_playlists=2, tracks_per_playlist=3, page_size=2
+    )
+    with patch("time.sleep", return_value=None) as patched_time_sleep:
+        main(["-o", str(tmp_path), "--adaptive-rate-limit"])
+        # the rate-limited request is held back for Retry-After by the adaptive rate
+        assert max(call.args[0] for call in patched_time_sleep.call_args_list) > 41
+    assert "after 1 cuts" in caplog.text
+    assert len(read_tables(tmp_path)["playlist_track_id_records"]) == 1 + 2 * 3
+
+
+def test_rate_limit_max_wait(
+    unordered_responses: responses.RequestsMock, tmp_path: Path
+):
+    unordered_responses.get(
+        f"{base_url}browse/categories/{default_category}/playlists",
+        status=429,
+        headers={"Retry-After": "1000"},
+    )
+    spotify_config = SpotifyConfig(client_id="X", client_secret="X")
+    config = Config(spotify=spotify_config, output_dir=tmp_path)
+    with patch("time.sleep", return_value=None) as patched_time_sleep:
+        with pytest.raises(RateLimitError):
+            run(config)
+        # Retry-After ends after rate_limit_max_wait_seconds, so the request gives up at once
+        patched_time_sleep.assert_not_called()
+
+
+def test_lean_models(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    routes = category_routes(num_playlists=3, tracks_per_playlist=5, page_size=2)
+    mock_category(
+        unordered_responses, num_playlists=3, tracks_per_playlist=5, page_size=2
+    )
+    state_path = tmp_path / "state.sqlite"
+    full_path = tmp_path / "full"
+    lean_path = tmp_path / "lean"
+    async_path = tmp_path / "async"
+    for path in (full_path, lean_path, async_path):
+        path.mkdir()
+    main(["-o", str(lean_path), "--lean-models", "--state", str(state_path)])
+    # the snapshots store the track rows, which are complete whatever the models
+    unordered_responses.calls.reset()
+    main(["-o", str(full_path), "--state", str(state_path)])
+    assert len(unordered_responses.calls) == 1 + 2
+
+    full_tables = read_tables(full_path)
+    assert read_tables(lean_path) == full_tables
+    aio = import_aio()
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=async_path,
+        lean_models=True,
+    )
+    builder = create_record_builder(config)
+    asyncio.run(aio.download(config, builder, transport=routes_transport(routes)))
+    builder.close()
+    assert read_tables(async_path) == full_tables
+
+
+def test_parquet(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    mock_category(
+        unordered_responses, num_playlists=3, tracks_per_playlist=5, page_size=2
+    )
+    csv_path = tmp_path / "csv"
+    parquet_path = tmp_path / "parquet"
+    csv_path.mkdir()
+    parquet_path.mkdir()
+    main(["-o", str(csv_path), "-f", "csv"])
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    main(["-o", str(parquet_path), "-f", "parquet", "--row-group-size", "4"])
+
+    def as_csv(value: any) -> str:
+        if value is None:
+            return ""
+        return value.isoformat() if isinstance(value, datetime) else str(value)
+
+    spotify_config = SpotifyConfig(client_id="X", client_secret="X")
+    for file in csv_path.iterdir():
+        table_name = file.name.removesuffix(".csv")
+        csv_config = Config(spotify_config, csv_path, file_type=FileType.csv)
+        parquet_config = Config(
+            spotify_config, parquet_path, file_type=FileType.parquet
+        )
+        csv_schema, csv_rows = read_table(csv_config, table_name)
+        schema, rows = read_table(parquet_config, table_name)
+        assert schema.column_names == csv_schema.column_names
+        assert [tuple(map(as_csv, row)) for row in rows] == list(csv_rows)
+
+    file = pq.ParquetFile(parquet_path / "playlist_track_id_records.parquet")
+    assert file.num_row_groups == 4
+    assert file.schema_arrow.field("playlist_added_at").type == pa.timestamp(
+        "us", tz="UTC"
+    )
+    file = pq.ParquetFile(parquet_path / "tracks_records.parquet")
+    assert file.schema_arrow.field("popularity").type == pa.int64()
+
+
+@pytest.mark.parametrize("file_type", [FileType.sqlite, FileType.duckdb])
+def test_database(
+    unordered_responses: responses.RequestsMock, tmp_path: Path, file_type: FileType
+):
+    mock_category(
+        unordered_responses, num_playlists=3, tracks_per_playlist=5, page_size=2
+    )
+    csv_path = tmp_path / "csv"
+    database_path = tmp_path / "database"
+    csv_path.mkdir()
+    database_path.mkdir()
+    main(["-o", str(csv_path), "-f", "csv"])
+    # the second run upserts the same rows
+    main(["-o", str(database_path), "-f", str(file_type), "--row-group-size", "4"])
+    main(["-o", str(database_path), "-f", str(file_type)])
+
+    spotify_config = SpotifyConfig(client_id="X", client_secret="X")
+    csv_config = Config(spotify_config, csv_path, file_type=FileType.csv)
+    database_config = Config(spotify_config, database_path, file_type=file_type)
+    assert sorted(table_names(database_config)) == sorted(table_names(csv_config))
+    for table_name in table_names(csv_config):
+        csv_schema, csv_rows = read_table(csv_config, table_name)
+        schema, rows = read_table(database_config, table_name)
+        assert schema.column_names == csv_schema.column_names
+        assert schema.primary_key
+        assert len(list(rows)) == len(list(csv_rows))
+    schema, _ = read_table(database_config, "playlist_track_id_records")
+    assert schema.primary_key == ("playlist_id", "track_id")
+    assert schema.column_types["playlist_added_at"] is datetime
+
+
+def test_append(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    mock_category(
+        unordered_responses, num_playlists=2, tracks_per_playlist=4, page_size=2
+    )
+    append_path = tmp_path / "append"
+    full_path = tmp_path / "full"
+    append_path.mkdir()
+    full_path.mkdir()
+    main(["-o", str(append_path), "--append"])
+
+    unordered_responses.reset()
+    unordered_responses.post(auth_url, json={"access_token": "XYZ"})
+    mock_category(
+        unordered_responses, num_playlists=3, tracks_per_playlist=4, page_size=2
+    )
+    # only the rows of the third playlist are appended
+    main(["-o", str(append_path), "--append"])
+    main(["-o", str(full_path)])
+
+    append_tables = read_tables(append_path)
+    full_tables = read_tables(full_path)
+    assert append_tables.keys() == full_tables.keys()
+    for table_name, lines in full_tables.items():
+        assert append_tables[table_name][0] == lines[0]
+        assert sorted(append_tables[table_name]) == sorted(lines)
+    index_path = append_path / INDEX_DIR / "tracks_records.sqlite"
+    assert index_path.exists()
+
+    # the tables are rewritten without appending, so their index is deleted
+    main(["-o", str(append_path)])
+    assert not index_path.exists()
+    assert read_tables(append_path) == full_tables
+
+
+def test_partitioned(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    # the latin category lists the first 3 playlists and the pop category the 4th one,
+    # whose first track is also the first one of the first playlist
+    shared_track = data.create_numbered_track(1000)
+    for url, params, body in category_routes(
+        num_playlists=4, tracks_per_playlist=3, page_size=4
+    ):
+        if "browse/categories" in url:
+            items = body["playlists"]["items"]
+            for category, category_items in (("pop", items[3:]), ("latin", items[:3])):
+                page = {**body["playlists"], "items": category_items, "total": 4}
+                unordered_responses.get(
+                    url.replace(default_category, category),
+                    match=[matchers.query_param_matcher(params)],
+                    json={"playlists": page},
+                )
+        else:
+            if url.endswith("playlists/PLAYLIST_ID4"):
+                items = [shared_track, *body["tracks"]["items"][1:]]
+                body = {**body, "tracks": {**body["tracks"], "items": items}}
+            unordered_responses.get(url, json=body)
+
+    def artists_callback(request):
+        ids = request.params["ids"].split(",")
+        artists = [data.create_full_artist(sid) for sid in ids]
+        return 200, {}, json.dumps({"artists": artists})
+
+    unordered_responses.add_callback(
+        responses.GET, f"{base_url}artists", callback=artists_callback
+    )
+    flat_path = tmp_path / "flat"
+    partitioned_path = tmp_path / "partitioned"
+    flat_path.mkdir()
+    partitioned_path.mkdir()
+    args = ["-f", "csv", "-c", "latin", "pop", "--enrich-artists"]
+    main(["-o", str(flat_path), *args])
+    main(["-o", str(partitioned_path), *args, "--partitioned"])
+
+    spotify_config = SpotifyConfig(client_id="X", client_secret="X")
+    flat_config = Config(spotify_config, flat_path, file_type=FileType.csv)
+    partitioned_config = Config(
+        spotify_config, partitioned_path, file_type=FileType.csv, partitioned=True
+    )
+    assert sorted(table_names(partitioned_config)) == sorted(table_names(flat_config))
+    fetched_date = datetime.now(timezone.utc).date().isoformat()
+    for table_name in table_names(flat_config):
+        flat_schema, flat_rows = read_table(flat_config, table_name)
+        schema, rows = read_table(partitioned_config, table_name)
+        assert schema.column_names == [
+            *flat_schema.column_names,
+            "category",
+            "fetched_date",
+        ]
+        rows = list(rows)
+        # the rows of the shared track are repeated in the partitions of both categories
+        assert list(dict.fromkeys(row[:-2] for row in rows)) == list(flat_rows)
+        assert {row[-1] for row in rows} == {fetched_date}
+
+    _, rows = read_table(partitioned_config, "tracks_records")
+    assert [row[-2] for row in rows if row[1] == shared_track["track"]["id"]] == [
+        "latin",
+        "pop",
+    ]
+    # the shared artist is enriched into the partitions of both categories as well
+    _, rows = read_table(partitioned_config, "artists_records")
+    shared_artist_id = shared_track["track"]["artists"][0]["id"]
+    assert [row[-2] for row in rows if row[0] == shared_artist_id] == ["latin", "pop"]
+
+    _, rows = read_table(partitioned_config, "playlist_records")
+    assert [(row[0], row[-2]) for row in rows] == [
+        ("PLAYLIST_ID1", "latin"),
+        ("PLAYLIST_ID2", "latin"),
+        ("PLAYLIST_ID3", "latin"),
+        ("PLAYLIST_ID4", "pop"),
+    ]
+    partition = (
+        partitioned_path
+        / "tracks_records"
+        / "category=pop"
+        / f"fetched_date={fetched_date}"
+    )
+    assert [path.name for path in partition.iterdir()] == ["part-0.csv"]
+
+
+def test_tables(unordered_responses: responses.RequestsMock, tmp_path: Path):
+    routes = category_routes(num_playlists=3, tracks_per_playlist=5, page_size=2)
+    mock_category(
+        unordered_responses, num_playlists=3, tracks_per_playlist=5, page_size=2
+    )
+    full_path = tmp_path / "full"
+    selected_path = tmp_path / "selected"
+    async_path = tmp_path / "async"
+    full_path.mkdir()
+    selected_path.mkdir()
+    async_path.mkdir()
+    main(["-o", str(full_path)])
+    unordered_responses.calls.reset()
+    tables = ["playlist_records", "category_playlists_records"]
+    main(["-o", str(selected_path), "--tables", *tables, "--enrich-artists"])
+
+    # only the listing and the playlist details are requested
+    urls = [call.request.url for call in unordered_responses.calls]
+    assert not any("/tracks" in url or "/artists" in url for url in urls)
+    assert sum("/playlists/PLAYLIST_ID" in url for url in urls) == 3
+    full_tables = read_tables(full_path)
+    selected_tables = read_tables(selected_path)
+    assert selected_tables == {name: full_tables[name] for name in tables}
+
+    httpx = pytest.importorskip("httpx")
+    aio = import_aio()
+    requested = []
+    transport = routes_transport(routes)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        return transport.handle_request(request)
+
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=async_path,
+        workers=2,
+        tables=tables,
+    )
+    builder = create_record_builder(config)
+    assert not builder.reads_tracks
+    asyncio.run(aio.download(config, builder, transport=httpx.MockTransport(handler)))
+    builder.close()
+    assert not any("/tracks" in url for url in requested)
+    assert read_tables(async_path) == selected_tables
+
+    with pytest.raises(ValueError):
+        create_record_builder(replace(config, tables=["albums_records"]))
@@ -0,0 +1,27 @@
+import pytest
+from pydantic import ValidationError
+
+import tests.data as data
+from paddle.downloader.lean import TrackModels
+from paddle.downloader.models import PlaylistTrack
+
+
+def test_lean_track_model():
+    models = TrackModels.lean(("track.id", "track.artists.name"))
+    assert TrackModels.lean(("track.id", "track.artists.name")) is models
+    track = models.track.model_validate(data.dummy_track_1)
+    assert track.model_dump() == {
+        "track": {
+            "type": "track",
+            "artists": [
+                {"type": "artist", "name": "Artist 1"},
+                {"type": "artist", "name": "Artist 2"},
+            ],
+            "id": "TRACKID1",
+        }
+    }
+    # the ignored fields are not validated
+    invalid = {**data.dummy_track_1, "is_local": "maybe"}
+    assert models.track.model_validate(invalid).track.id == "TRACKID1"
+    with pytest.raises(ValidationError):
+        PlaylistTrack.model_validate(invalid)
@@ -0,0 +1,58 @@
+import tests.data as data
+from paddle.downloader.config import Config, SpotifyConfig
+from paddle.downloader.main import create_record_builder
+from paddle.downloader.models import Playlist, PlaylistTrack
+from paddle.downloader.projection import (
+    FieldTree,
+    Projection,
+    format_fields,
+    merge,
+    paths_tree,
+    required_fields,
+)
+
+
+def project(value: any, tree: FieldTree) -> any:
+    """
+    Applies a field tree like the API does with the `fields` parameter.
+    """
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {k: project(v, tree[k]) for k, v in value.items() if k in tree}
+    return value
+
+
+def test_format_fields():
+    tree = merge(paths_tree(["track.album.id", "track.id"]), {"track": {"album": {}}})
+    assert format_fields(tree) == "track(album,id)"
+    assert format_fields(paths_tree(["b.c", "a", "b.d"])) == "a,b(c,d)"
+
+
+def test_projected_models_validate(tmp_path):
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=tmp_path,
+        enrich_albums=True,
+    )
+    builder = create_record_builder(config)
+    builder.close()
+
+    track_tree = merge(required_fields(PlaylistTrack), paths_tree(builder.track_paths))
+    item = data.dummy_track_1
+    projected = project(item, track_tree)
+    assert "available_markets" not in projected["track"]
+    track = PlaylistTrack.model_validate(projected)
+    assert track.track.album.id == item["track"]["album"]["id"]
+    assert track.track.artists[0].name == item["track"]["artists"][0]["name"]
+
+    playlist_tree = merge(required_fields(Playlist), paths_tree(builder.playlist_paths))
+    playlist = data.create_playlist(num=1, tracks=None)
+    assert Playlist.model_validate(project(playlist, playlist_tree)).followers
+
+    projection = Projection.create(builder.playlist_paths, builder.track_paths)
+    assert projection.tracks.startswith("items(")
+    assert projection.tracks.endswith(",limit,next,offset,total")
+    assert f"tracks({projection.tracks})" in projection.playlist
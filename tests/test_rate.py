@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import pytest
+
+from paddle.downloader.rate import AdaptiveRate, HostCooldown
+
+
+@pytest.fixture
+def clock():
+    with patch("time.monotonic", return_value=100.0) as monotonic:
+        yield monotonic
+
+
+def test_reserve_paces_requests(clock):
+    rate = AdaptiveRate(rate=2, min_rate=0.1, increase=0.1)
+    assert [rate.reserve() for _ in range(3)] == [100.0, 100.5, 101.0]
+    clock.return_value = 200.0
+    assert rate.reserve() == 200.0
+
+
+def test_additive_increase(clock):
+    rate = AdaptiveRate(rate=2, min_rate=0.1, increase=0.1)
+    # a second worth of successful requests increases the rate by about `increase`
+    for _ in range(2):
+        rate.on_success()
+    assert rate.rate == pytest.approx(2.1, abs=0.01)
+
+
+def test_multiplicative_decrease(clock):
+    rate = AdaptiveRate(rate=4, min_rate=1, increase=0.1)
+    sent_at = [rate.reserve() for _ in range(3)]
+    clock.return_value = 101.0
+    rate.on_rate_limited(sent_at[0], retry_after=10)
+    # the other requests were sent at the old rate, they do not cut it again
+    rate.on_rate_limited(sent_at[1], retry_after=10)
+    assert rate.rate == 2
+    assert rate.cuts == 1
+    # Retry-After holds back all requests
+    assert rate.reserve() == 111.0
+    rate.on_rate_limited(111.0, retry_after=0)
+    rate.on_rate_limited(111.5, retry_after=0)
+    assert rate.rate == 1
+    assert str(rate) == "1.00 requests/s after 3 cuts"
+
+
+def test_host_cooldown(clock):
+    cooldown = HostCooldown()
+    cooldown.start("api.spotify.com", retry_after=30)
+    cooldown.start("api.spotify.com", retry_after=10)
+    clock.return_value = 110.0
+    assert cooldown.remaining("api.spotify.com") == 20
+    assert cooldown.remaining("accounts.spotify.com") == 0
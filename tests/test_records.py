@@ -0,0 +1,186 @@
+import sqlite3
+from pathlib import Path
+from typing import List
+
+import tests.data as data
+from paddle.downloader import records
+from paddle.downloader.config import Config, FileType, SpotifyConfig
+from paddle.downloader.main import build_records
+from paddle.downloader.models import Playlist, PlaylistTrack
+from paddle.downloader.records import (
+    ArtistsRecords,
+    Builder,
+    PlaylistRowsAdapter,
+    RecordBuilder,
+    TrackArtistIdRecords,
+    TracksRecords,
+    INDEX_DIR,
+    create_id_set,
+    read_table,
+    table_path,
+)
+from paddle.downloader.rows import TrackRow, PlaylistCounts
+
+
+class LegacyBuilder(Builder):
+    def __init__(self):
+        self.playlists = []
+
+    def add_playlist(self, playlist: Playlist, rows: List[TrackRow]):
+        self.playlists.append((playlist.id, [row.id for row in rows]))
+
+    def close(self):
+        pass
+
+
+class StreamingBuilder(Builder):
+    def __init__(self):
+        self.counts = []
+
+    def end_playlist(self, playlist: Playlist, counts: PlaylistCounts):
+        self.counts.append(counts)
+
+    def close(self):
+        pass
+
+
+def test_end_playlist():
+    legacy = LegacyBuilder()
+    streaming = StreamingBuilder()
+    builder = RecordBuilder([legacy, streaming])
+    assert isinstance(builder.builders[0], PlaylistRowsAdapter)
+    assert builder.builders[1] is streaming
+
+    playlist = Playlist.model_validate(data.dummy_playlist1)
+    tracks = (data.dummy_track_1, data.dummy_track_2)
+    rows = (TrackRow.create(PlaylistTrack.model_validate(t)) for t in tracks)
+    counts = build_records(builder, playlist, rows)
+    build_records(builder, playlist, iter(()))
+
+    assert counts == PlaylistCounts(items=2, tracks=2)
+    assert streaming.counts == [counts, PlaylistCounts()]
+    assert legacy.playlists == [
+        (playlist.id, ["TRACKID1", "TRACKID2"]),
+        (playlist.id, []),
+    ]
+
+
+def test_track_extractor(tmp_path: Path):
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=tmp_path,
+        file_type=FileType.csv,
+    )
+    streaming = StreamingBuilder()
+    builder = RecordBuilder(
+        [
+            TracksRecords(config),
+            TrackArtistIdRecords(config),
+            ArtistsRecords(config),
+            streaming,
+        ]
+    )
+    # the track tables are only fed by the extractor
+    assert builder.track_builders == []
+    assert TrackArtistIdRecords.track_paths == ("track.id", "track.artists.id")
+
+    playlist = Playlist.model_validate(data.dummy_playlist1)
+    # the first artist of the second track is a duplicate, but not the second one
+    rows = [
+        TrackRow(
+            "track", id="TRACKID1", artist_ids=("A1", "A2"), artist_names=("a1", "a2")
+        ),
+        TrackRow(
+            "track", id="TRACKID2", artist_ids=("A1", "A3"), artist_names=("a1", "a3")
+        ),
+        TrackRow("episode"),
+        TrackRow(
+            "track", id="TRACKID1", artist_ids=("A1", "A2"), artist_names=("a1", "a2")
+        ),
+    ]
+    build_records(builder, playlist, rows)
+    builder.close()
+
+    assert streaming.counts == [PlaylistCounts(items=4, tracks=3)]
+    _, track_rows = read_table(config, "tracks_records")
+    assert [row[1] for row in track_rows] == ["TRACKID1", "TRACKID2"]
+    _, track_artist_rows = read_table(config, "track_artist_id_records")
+    assert list(track_artist_rows) == [
+        ("TRACKID1", "A1"),
+        ("TRACKID1", "A2"),
+        ("TRACKID2", "A1"),
+        ("TRACKID2", "A3"),
+    ]
+    _, artist_rows = read_table(config, "artists_records")
+    assert list(artist_rows) == [("A1", "a1"), ("A2", "a2"), ("A3", "a3")]
+
+
+def test_artists_after_duplicate(tmp_path: Path):
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=tmp_path,
+        file_type=FileType.csv,
+    )
+    builder = RecordBuilder([TrackArtistIdRecords(config), ArtistsRecords(config)])
+    playlist = Playlist.model_validate(data.dummy_playlist1)
+    # the featured artists of the second track follow the artist of the first one
+    rows = [
+        TrackRow("track", id="TRACKID1", artist_ids=("A1",), artist_names=("a1",)),
+        TrackRow(
+            "track",
+            id="TRACKID2",
+            artist_ids=("A1", "A2", "A3"),
+            artist_names=("a1", "a2", "a3"),
+        ),
+    ]
+    build_records(builder, playlist, rows)
+    builder.close()
+
+    _, track_artist_rows = read_table(config, "track_artist_id_records")
+    assert [row[1] for row in track_artist_rows] == ["A1", "A1", "A2", "A3"]
+    _, artist_rows = read_table(config, "artists_records")
+    assert [row[0] for row in artist_rows] == ["A1", "A2", "A3"]
+
+
+def test_commit_index(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(records, "WRITE_BATCH_SIZE", 2)
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=tmp_path,
+        file_type=FileType.csvgz,
+        append=True,
+    )
+    builder = RecordBuilder([TracksRecords(config)])
+    playlist = Playlist.model_validate(data.dummy_playlist1)
+    rows = [TrackRow("track", id=f"TRACKID{n}") for n in range(5)]
+    build_records(builder, playlist, rows)
+
+    # the run fails before closing its builders, after writing and committing two batches
+    _, track_rows = read_table(config, "tracks_records")
+    assert [row[1] for row in track_rows] == [f"TRACKID{n}" for n in range(4)]
+    assert len(create_id_set(config, "tracks_records")) == 4
+
+
+def test_spill_uncommitted_keys(tmp_path: Path):
+    config = Config(
+        spotify=SpotifyConfig(client_id="X", client_secret="X"),
+        output_dir=tmp_path,
+        file_type=FileType.csv,
+        append=True,
+        dedup_max_keys=2,
+    )
+    builder = TracksRecords(config)
+    playlist = Playlist.model_validate(data.dummy_playlist1)
+    rows = [TrackRow("track", id=f"TRACKID{n:015}") for n in range(5)]
+    build_records(RecordBuilder([builder]), playlist, rows)
+    assert len(builder.ids) == 5
+
+    # were the run to fail before writing out its rows, their spilled keys are not committed
+    index = sqlite3.connect(tmp_path / INDEX_DIR / "tracks_records.sqlite")
+    assert index.execute("SELECT count(*) FROM keys").fetchone() == (0,)
+    index.close()
+    assert table_path(config, "tracks_records").stat().st_size == 0
+    builder.close()
+    _, track_rows = read_table(config, "tracks_records")
+    assert len(list(track_rows)) == 5
+    assert len(create_id_set(config, "tracks_records")) == 5
@@ -0,0 +1,23 @@
+import json
+
+import tests.data as data
+from paddle.downloader.lean import TrackModels
+from paddle.downloader.models import PlaylistTrack
+from paddle.downloader.rows import TrackRow
+
+
+def test_track_row():
+    row = TrackRow.create(PlaylistTrack.model_validate(data.dummy_track_1))
+    assert row.type == "track"
+    assert row.id == "TRACKID1"
+    assert row.artist_ids == ("ARTISTID1", "ARTISTID2")
+    assert row.artist_names == ("Artist 1", "Artist 2")
+    assert not hasattr(row, "__dict__")
+    # the rows are stored as JSON arrays
+    assert TrackRow.fromtuple(json.loads(json.dumps(row.astuple()))) == row
+
+
+def test_track_row_of_lean_track():
+    models = TrackModels.lean(TrackRow.track_paths)
+    full = TrackRow.create(PlaylistTrack.model_validate(data.dummy_track_2))
+    assert TrackRow.create(models.track.model_validate(data.dummy_track_2)) == full
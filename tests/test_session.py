@@ -0,0 +1,31 @@
+import builtins
+import json
+
+import pytest
+
+from paddle.downloader.config import JsonDecoder, SpotifyConfig
+from paddle.downloader.session import get_json_loads
+
+
+def test_json_loads():
+    assert get_json_loads(JsonDecoder.stdlib) is json.loads
+    orjson = pytest.importorskip("orjson")
+    assert get_json_loads(JsonDecoder.orjson) is orjson.loads
+    assert get_json_loads(JsonDecoder.orjson)(b'{"id": 1}') == {"id": 1}
+
+
+def test_json_loads_fallback(monkeypatch, caplog):
+    original_import = builtins.__import__
+
+    def import_without_extras(name, *args, **kwargs):
+        if name in ("orjson", "msgspec"):
+            raise ImportError(name)
+        return original_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", import_without_extras)
+    # the default decoder does not require the `json` extra
+    spotify_config = SpotifyConfig(client_id="X", client_secret="X")
+    assert get_json_loads(spotify_config.json_decoder) is json.loads
+    assert caplog.text == ""
+    assert get_json_loads(JsonDecoder.msgspec) is json.loads
+    assert "msgspec is not installed" in caplog.text